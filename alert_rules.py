@@ -0,0 +1,161 @@
+import os
+import time
+from collections import deque
+
+from dotenv import load_dotenv
+
+from twilio_alerts import (
+    ADJUSTED_CONFIDENCE_THRESHOLD,
+    FIRE_CONFIDENCE_THRESHOLD,
+    SENSOR_CONFIDENCE_THRESHOLD,
+    send_camera_alert,
+    send_fire_emergency_alert,
+    send_sensor_alert,
+)
+
+load_dotenv()
+
+# N-of-M rule: an alert condition is raised when ALERT_MIN_FRAMES of the last ALERT_WINDOW_FRAMES frames exceed the threshold
+ALERT_WINDOW_FRAMES = int(os.getenv("ALERT_WINDOW_FRAMES", "5"))
+ALERT_MIN_FRAMES = int(os.getenv("ALERT_MIN_FRAMES", "3"))
+# A raised condition clears only once the whole window is this many points below the threshold
+ALERT_HYSTERESIS = float(os.getenv("ALERT_HYSTERESIS", "5.0"))
+# While a condition stays raised, the alert is re-queued this often (the dispatcher cooldown still applies)
+ALERT_REPEAT_SECONDS = float(os.getenv("ALERT_REPEAT_SECONDS", "60"))
+
+# Weights of camera and sensor confidence in the fused score
+CAMERA_WEIGHT = 0.7
+SENSOR_WEIGHT = 0.3
+
+
+def fuse_confidence(fire_confidence, sensor_confidence):
+    """
+    Adjusted confidence (weighted average of camera and sensor confidence).
+    """
+    return (fire_confidence * CAMERA_WEIGHT) + (sensor_confidence * SENSOR_WEIGHT)
+
+
+class ThresholdRule:
+    """
+    N-of-M threshold with hysteresis for one confidence signal, so single-frame flicker neither raises nor clears it.
+    """
+
+    def __init__(self, threshold, min_frames=ALERT_MIN_FRAMES, window=ALERT_WINDOW_FRAMES, hysteresis=ALERT_HYSTERESIS):
+        self.threshold = threshold
+        self.min_frames = max(1, min(min_frames, window))
+        self.hysteresis = hysteresis
+        self.history = deque(maxlen=max(1, window))
+        self.active = False
+
+    def update(self, value):
+        """
+        :return: True if this value raised the condition
+        """
+        self.history.append(value)
+        if not self.active:
+            if sum(v >= self.threshold for v in self.history) >= self.min_frames:
+                self.active = True
+                return True
+        elif all(v < self.threshold - self.hysteresis for v in self.history):
+            self.active = False
+        return False
+
+
+class SensorAlertMonitor:
+    """
+    Evaluates the sensor confidence on every new sensor reading, independently of the camera streams,
+    so sensor alerts still go out for a site without a camera or while its camera is down or reconnecting.
+    """
+
+    def __init__(self, score, location, repeat_seconds=ALERT_REPEAT_SECONDS):
+        """
+        :param score: Callable(reading) returning the sensor fire confidence (0-100)
+        """
+        self.score = score
+        self.location = location
+        self.repeat_seconds = repeat_seconds
+        self.rule = ThresholdRule(SENSOR_CONFIDENCE_THRESHOLD)
+        self._last_queued = 0
+        self.last_confidence = None
+        self.triggers = 0
+
+    @property
+    def active(self):
+        return self.rule.active
+
+    def update(self, reading, updated_at):
+        """
+        Call with each new reading, e.g. as a SensorCache listener.
+        :param updated_at: time.time() at which the reading was fetched
+        """
+        confidence = self.score(reading)
+        self.last_confidence = confidence
+        raised = self.rule.update(confidence)
+        now = time.time()
+        if raised:
+            self.triggers += 1
+        if raised or (self.rule.active and now - self._last_queued >= self.repeat_seconds):
+            self._last_queued = now
+            send_sensor_alert(confidence, self.location, updated_at)
+
+    def stats(self):
+        return {
+            "location": self.location,
+            "active": self.rule.active,
+            "last_confidence": self.last_confidence,
+            "triggers": self.triggers,
+        }
+
+
+class AlertEvaluator:
+    """
+    Evaluates the camera and fused confidences of one stream on every processed frame and
+    queues alerts on the background dispatcher as soon as a condition is raised.
+    The sensor rule runs on sensor readings instead, see SensorAlertMonitor.
+    """
+
+    def __init__(self, location, repeat_seconds=ALERT_REPEAT_SECONDS, sensor_monitor=None):
+        """
+        :param sensor_monitor: SensorAlertMonitor whose state is reported as the 'sensor' rule
+        """
+        self.location = location
+        self.repeat_seconds = repeat_seconds
+        self.sensor_monitor = sensor_monitor
+        # name -> (rule, alert function)
+        self.rules = {
+            'fire': (ThresholdRule(FIRE_CONFIDENCE_THRESHOLD), send_camera_alert),
+            'adjusted': (ThresholdRule(ADJUSTED_CONFIDENCE_THRESHOLD), send_fire_emergency_alert),
+        }
+        self._last_queued = {}
+        self.triggers = 0
+        self.last_trigger_latency = None
+
+    def _active(self):
+        active = {name: rule.active for name, (rule, _) in self.rules.items()}
+        active['sensor'] = self.sensor_monitor.active if self.sensor_monitor else False
+        return active
+
+    def evaluate(self, fire_confidence, adjusted_confidence, event_time):
+        """
+        :param event_time: time.time() at which the frame was captured
+        :return: Dictionary of {rule_name: active}, including the 'sensor' rule of the sensor monitor
+        """
+        values = {'fire': fire_confidence, 'adjusted': adjusted_confidence}
+        now = time.time()
+        for name, (rule, send_alert) in self.rules.items():
+            raised = rule.update(values[name])
+            if raised:
+                self.triggers += 1
+                self.last_trigger_latency = now - event_time
+            if raised or (rule.active and now - self._last_queued.get(name, 0) >= self.repeat_seconds):
+                self._last_queued[name] = now
+                send_alert(values[name], self.location, event_time)
+        return self._active()
+
+    def stats(self):
+        return {
+            "location": self.location,
+            "active": self._active(),
+            "triggers": self.triggers,
+            "last_trigger_latency_seconds": self.last_trigger_latency,
+        }
@@ -0,0 +1,134 @@
+"""
+Load test: how many concurrent MJPEG viewers and /status clients one server process handles
+before the p99 latency of /status goes past a limit.
+
+Start the server (python serve.py) with at least one running stream, then:
+    python benchmarks/load_test.py --url http://localhost:5000 --stream default --levels 10,25,50,100,200
+
+At every level, `level` viewers read /video_feed/<stream> and `level` clients poll /status/<stream>
+for --duration seconds. The script reports /status latency percentiles and the frame rate each viewer
+actually received, and stops at the first level whose /status p99 exceeds --p99-limit-ms.
+"""
+import argparse
+import http.client
+import json
+import time
+from threading import Event, Lock, Thread
+from urllib.parse import urlparse
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def status_client(host, port, path, interval, stop, latencies, errors, lock):
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    while not stop.is_set():
+        start_time = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status == 200
+        except Exception:
+            ok = False
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=10)
+        elapsed = time.perf_counter() - start_time
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors[0] += 1
+        stop.wait(max(0.0, interval - elapsed))
+    connection.close()
+
+
+def mjpeg_viewer(host, port, path, stop, frame_counts, index):
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        while not stop.is_set():
+            line = response.readline()
+            if not line:
+                break
+            if line.startswith(b'Content-Length:'):
+                length = int(line.split(b':', 1)[1])
+                response.readline()
+                response.read(length)
+                frame_counts[index] += 1
+    except Exception:
+        pass
+    finally:
+        connection.close()
+
+
+def run_level(args, host, port, level):
+    stop = Event()
+    lock = Lock()
+    latencies, errors = [], [0]
+    frame_counts = [0] * level
+    threads = []
+    for index in range(level):
+        threads.append(Thread(target=mjpeg_viewer, daemon=True,
+                              args=(host, port, f"/video_feed/{args.stream}", stop, frame_counts, index)))
+        threads.append(Thread(target=status_client, daemon=True,
+                              args=(host, port, f"/status/{args.stream}", args.poll_interval, stop,
+                                    latencies, errors, lock)))
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    ordered = sorted(latencies)
+    viewer_fps = sorted(count / args.duration for count in frame_counts)
+    return {
+        "level": level,
+        "status_requests": len(ordered),
+        "status_errors": errors[0],
+        "status_p50_ms": percentile(ordered, 50) * 1000,
+        "status_p99_ms": percentile(ordered, 99) * 1000,
+        "viewer_fps_min": viewer_fps[0] if viewer_fps else 0.0,
+        "viewer_fps_median": percentile(viewer_fps, 50),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent viewer and /status load test")
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--stream', default='default')
+    parser.add_argument('--levels', default='10,25,50,100,200', help="Comma-separated client counts")
+    parser.add_argument('--duration', type=float, default=15.0, help="Seconds per level")
+    parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between polls per status client")
+    parser.add_argument('--p99-limit-ms', type=float, default=250.0)
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    url = urlparse(args.url)
+    results = []
+    max_level = 0
+    for level in (int(level) for level in args.levels.split(',')):
+        result = run_level(args, url.hostname, url.port or 80, level)
+        results.append(result)
+        print(f"{level:5d} viewers + {level:5d} status clients: "
+              f"status p50 {result['status_p50_ms']:7.1f} ms, p99 {result['status_p99_ms']:7.1f} ms, "
+              f"errors {result['status_errors']}, viewer fps min {result['viewer_fps_min']:.1f} "
+              f"median {result['viewer_fps_median']:.1f}")
+        if result['status_p99_ms'] > args.p99_limit_ms or result['status_errors']:
+            break
+        max_level = level
+
+    print(f"Highest level within p99 {args.p99_limit_ms:.0f} ms: {max_level}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"p99_limit_ms": args.p99_limit_ms, "max_level": max_level, "levels": results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,377 @@
+"""
+Offline benchmark of the detection pipeline for comparing models, resolutions and batch sizes across commits.
+
+Usage:
+    python benchmarks/pipeline_bench.py --models best.pt,v8n.pt --resolutions 640x360,960x540 --batch-sizes 1,4,8
+    python benchmarks/pipeline_bench.py --video recordings/kitchen.mp4 --mode pipeline --frame-skips 1,3
+    python benchmarks/pipeline_bench.py --compare benchmark-results/old.json --output benchmark-results/new.json
+
+Each configuration runs in a fresh subprocess, so the memory figures of one do not leak into the next.
+Sensors come from the in-memory backend and alerts go to the fake Twilio client; nothing leaves the machine.
+
+Modes:
+    detect    `batch_size` threads call detect_fire() on the same frames, so the shared scheduler forms
+              batches of up to that size. Reports per-call latency and frames per second.
+    pipeline  Runs process_video() on the video (a synthetic one if --video is not given) until it ends.
+              Reports processed frames per second, capture-to-status latency and per-stage timings.
+
+Results are written as JSON together with the commit hash, host and Python version.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from threading import Thread
+
+import cv2
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; CPU and memory figures are then omitted
+    resource = None
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Reading served by the in-memory sensor backend; well below every alert threshold
+BENCH_SENSOR_READING = {"co": 0.004, "humidity": 50.0, "lpg": 0.007, "smoke": 0.02, "temp": 25.0}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def git_commit():
+    """
+    :return: Tuple of (commit hash or None, True if the working tree has uncommitted changes)
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit, bool(dirty)
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+
+
+def synthetic_frames(count, width=1280, height=720, seed=0):
+    """
+    Deterministic frames with a moving bright blob on a noisy background.
+    """
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 80, (height, width, 3), dtype=np.uint8)
+    frames = []
+    for index in range(count):
+        frame = background.copy()
+        x = int((index * 17) % width)
+        cv2.circle(frame, (x, height // 2), height // 10, (0, 140, 255), -1)
+        frames.append(frame)
+    return frames
+
+
+def write_synthetic_video(path, count, width=1280, height=720, fps=30):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+    for frame in synthetic_frames(count, width, height):
+        writer.write(frame)
+    writer.release()
+
+
+def read_frames(video, count):
+    cap = cv2.VideoCapture(video)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise ValueError(f"No frames could be read from {video}")
+    return frames
+
+
+def usage_snapshot():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime, usage.ru_maxrss
+
+
+def usage_report(before, after, wall_seconds):
+    """
+    CPU use in cores (1.0 = one core busy) and peak resident memory of the benchmark process.
+    """
+    if before is None or after is None:
+        return {"cpu_cores": None, "peak_rss_mb": None}
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss_bytes = after[1] if sys.platform == 'darwin' else after[1] * 1024
+    return {
+        "cpu_cores": (after[0] - before[0]) / wall_seconds if wall_seconds else 0.0,
+        "peak_rss_mb": peak_rss_bytes / (1024 * 1024),
+    }
+
+
+def run_detect(app, frames, batch_size):
+    """
+    `batch_size` threads each call detect_fire() on their share of the frames.
+    """
+    latencies = [[] for _ in range(batch_size)]
+
+    def worker(index):
+        stream_id = f"bench-{index}"
+        for frame in frames[index::batch_size]:
+            start_time = time.perf_counter()
+            app.detect_fire(frame, stream_id)
+            latencies[index].append(time.perf_counter() - start_time)
+
+    threads = [Thread(target=worker, args=(index,)) for index in range(batch_size)]
+    before = usage_snapshot()
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - start_time
+    after = usage_snapshot()
+
+    ordered = sorted(latency for thread_latencies in latencies for latency in thread_latencies)
+    result = {
+        "frames": len(ordered),
+        "seconds": wall_seconds,
+        "frames_per_second": len(ordered) / wall_seconds if wall_seconds else 0.0,
+        "latency_ms_mean": sum(ordered) / len(ordered) * 1000 if ordered else 0.0,
+        "latency_ms_p50": percentile(ordered, 50) * 1000,
+        "latency_ms_p95": percentile(ordered, 95) * 1000,
+        "latency_ms_p99": percentile(ordered, 99) * 1000,
+        "mean_batch_size": app.inference_scheduler.stats()["mean_batch_size"],
+    }
+    result.update(usage_report(before, after, wall_seconds))
+    return result
+
+
+def run_pipeline(app, video, stream_count):
+    """
+    Run process_video() on `stream_count` streams reading the same video until they all end.
+    """
+    from metrics import FRAME_LATENCY_SECONDS, STAGE_SECONDS, metrics
+
+    before = usage_snapshot()
+    start_time = time.perf_counter()
+    streams = [app.stream_manager.start(f"bench-{index}", video, app.process_video, "Benchmark")
+               for index in range(stream_count)]
+    for stream in streams:
+        stream.thread.join()
+    wall_seconds = time.perf_counter() - start_time
+    after = usage_snapshot()
+
+    summary = metrics.summary()
+    processed = sum(stream.state.updates for stream in streams)
+    latency = summary.get(FRAME_LATENCY_SECONDS, [])
+    stages = {}
+    for entry in summary.get(STAGE_SECONDS, []):
+        stage = stages.setdefault(entry["stage"], {"count": 0, "total": 0.0, "p95": 0.0})
+        stage["count"] += entry["count"]
+        stage["total"] += entry["mean"] * entry["count"]
+        stage["p95"] = max(stage["p95"], entry["p95"])
+    result = {
+        "frames": processed,
+        "source_frames": stages.get('capture', {}).get('count', 0),
+        "seconds": wall_seconds,
+        "frames_per_second": processed / wall_seconds if wall_seconds else 0.0,
+        # Capture-to-status latency, estimated from the /metrics histogram buckets
+        "latency_ms_mean": max((entry["mean"] for entry in latency), default=0.0) * 1000,
+        "latency_ms_p50": max((entry["p50"] for entry in latency), default=0.0) * 1000,
+        "latency_ms_p95": max((entry["p95"] for entry in latency), default=0.0) * 1000,
+        "latency_ms_p99": max((entry["p99"] for entry in latency), default=0.0) * 1000,
+        "mean_batch_size": app.inference_scheduler.stats()["mean_batch_size"],
+        "stages_ms": {
+            name: {"mean": stage["total"] / stage["count"] * 1000 if stage["count"] else 0.0,
+                   "p95": stage["p95"] * 1000}
+            for name, stage in sorted(stages.items())
+        },
+    }
+    result.update(usage_report(before, after, wall_seconds))
+    return result
+
+
+def run_one(config):
+    """
+    Child process: run one configuration and print its result as JSON on the last line.
+    The environment (resolution, batch size, sensor and Twilio stubs) is set by the parent.
+    """
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(REPO_ROOT)
+    import fire_detection_inference as app
+    from sensor_cache import SENSOR_PATH
+
+    app.sensor_cache.source.set(SENSOR_PATH, BENCH_SENSOR_READING)
+    model_path = os.path.join('models', config["model"])
+    if not app.load_model(model_path):
+        raise RuntimeError(f"Could not load {model_path}: {app.model_registry.last_error}")
+
+    if config["mode"] == 'detect':
+        width, height = config["resolution"]
+        frames = read_frames(config["video"], config["frames"]) if config["video"] else synthetic_frames(config["frames"])
+        frames = [cv2.resize(frame, (width, height)) for frame in frames]
+        # Untimed pass so lazy initialization does not count against the first configuration
+        app.detect_fire(frames[0], "bench-warmup")
+        result = run_detect(app, frames, config["batch_size"])
+    else:
+        result = run_pipeline(app, config["video"], config["batch_size"])
+
+    result["backend"] = app.model_registry.active.backend
+    print(json.dumps(result))
+
+
+def config_env(config):
+    width, height = config["resolution"]
+    env = dict(os.environ)
+    env.update({
+        "SENSOR_BACKEND": "memory",
+        "TWILIO_FAKE_CLIENT": "true",
+        "PROCESS_WIDTH": str(width),
+        "PROCESS_HEIGHT": str(height),
+        "INFERENCE_MAX_BATCH_SIZE": str(config["batch_size"]),
+        "FRAME_SKIP_MIN": str(config["frame_skip"]),
+        "FRAME_SKIP_MAX": str(config["frame_skip"]),
+    })
+    return env
+
+
+def run_config(config, timeout):
+    process = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--run-one', json.dumps(config)],
+        env=config_env(config), capture_output=True, text=True, timeout=timeout,
+    )
+    lines = process.stdout.strip().splitlines()
+    if process.returncode != 0 or not lines:
+        error = (process.stderr.strip().splitlines() or ["unknown error"])[-1]
+        return {"error": error}
+    return json.loads(lines[-1])
+
+
+def compare(baseline_path, results):
+    """
+    Print throughput and p95 latency changes against a previous results file, matching configurations.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    keys = ('mode', 'model', 'resolution', 'batch_size', 'frame_skip')
+    previous = {tuple(str(entry.get(key)) for key in keys): entry for entry in baseline["results"]}
+    print(f"\nCompared with {baseline.get('commit', 'unknown')[:12]}:")
+    for entry in results:
+        old = previous.get(tuple(str(entry.get(key)) for key in keys))
+        if not old or "error" in old or "error" in entry:
+            continue
+        fps_change = (entry["frames_per_second"] / old["frames_per_second"] - 1) * 100 if old["frames_per_second"] else 0.0
+        print(f"  {describe(entry)}: fps {old['frames_per_second']:.1f} -> {entry['frames_per_second']:.1f} "
+              f"({fps_change:+.1f}%), p95 {old['latency_ms_p95']:.1f} -> {entry['latency_ms_p95']:.1f} ms")
+
+
+def describe(entry):
+    width, height = entry["resolution"]
+    return (f"{entry['mode']:8s} {entry['model']:16s} {width}x{height} batch {entry['batch_size']} "
+            f"skip {entry['frame_skip']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline detection pipeline benchmark")
+    parser.add_argument('--models', help="Comma-separated .pt files in models/ (default: every .pt file)")
+    parser.add_argument('--video', help="Video file to use instead of synthetic frames")
+    parser.add_argument('--mode', choices=['detect', 'pipeline', 'both'], default='detect')
+    parser.add_argument('--resolutions', default='640x360', help="Comma-separated WIDTHxHEIGHT inference resolutions")
+    parser.add_argument('--batch-sizes', default='1,4,8',
+                        help="Comma-separated batch sizes (detect: concurrent callers; pipeline: concurrent streams)")
+    parser.add_argument('--frame-skips', default='1', help="Comma-separated fixed frame skips for pipeline mode")
+    parser.add_argument('--frames', type=int, default=200, help="Frames per configuration (synthetic video length)")
+    parser.add_argument('--timeout', type=float, default=900.0, help="Seconds before a configuration is abandoned")
+    parser.add_argument('--output', help="Results file (default: benchmark-results/<commit>-<time>.json)")
+    parser.add_argument('--compare', help="Previous results file to compare against")
+    parser.add_argument('--run-one', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        run_one(json.loads(args.run_one))
+        return
+
+    models = args.models.split(',') if args.models else sorted(
+        f for f in os.listdir(os.path.join(REPO_ROOT, 'models')) if f.endswith('.pt'))
+    if not models:
+        parser.error("No .pt models found in models/; pass --models")
+    resolutions = [tuple(int(v) for v in resolution.split('x')) for resolution in args.resolutions.split(',')]
+    batch_sizes = [int(size) for size in args.batch_sizes.split(',')]
+    frame_skips = [int(skip) for skip in args.frame_skips.split(',')]
+    modes = ['detect', 'pipeline'] if args.mode == 'both' else [args.mode]
+
+    video = os.path.abspath(args.video) if args.video else None
+    temp_dir = None
+    if 'pipeline' in modes and video is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        pipeline_video = os.path.join(temp_dir.name, 'synthetic.avi')
+        write_synthetic_video(pipeline_video, args.frames)
+    else:
+        pipeline_video = video
+
+    commit, dirty = git_commit()
+    results = []
+    for mode in modes:
+        for model in models:
+            for resolution in resolutions:
+                for batch_size in batch_sizes:
+                    for frame_skip in (frame_skips if mode == 'pipeline' else [1]):
+                        config = {
+                            "mode": mode, "model": model, "resolution": list(resolution),
+                            "batch_size": batch_size, "frame_skip": frame_skip, "frames": args.frames,
+                            "video": pipeline_video if mode == 'pipeline' else video,
+                        }
+                        result = run_config(config, args.timeout)
+                        entry = {key: config[key] for key in ('mode', 'model', 'resolution', 'batch_size', 'frame_skip')}
+                        entry.update(result)
+                        results.append(entry)
+                        if "error" in entry:
+                            print(f"{describe(entry)}: error: {entry['error']}")
+                        else:
+                            print(f"{describe(entry)}: {entry['frames_per_second']:7.1f} fps, "
+                                  f"p50 {entry['latency_ms_p50']:7.1f} ms, p95 {entry['latency_ms_p95']:7.1f} ms, "
+                                  f"cpu {entry['cpu_cores'] or 0:.2f} cores, rss {entry['peak_rss_mb'] or 0:.0f} MB "
+                                  f"[{entry['backend']}]")
+
+    if temp_dir is not None:
+        temp_dir.cleanup()
+
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": time.time(),
+        "host": {
+            "node": platform.node(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+        },
+        "video": video,
+        "frames": args.frames,
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        REPO_ROOT, 'benchmark-results', f"{(commit or 'unknown')[:12]}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Microbenchmark: pandas + RandomForestClassifier.predict_proba vs. the compiled NumPy forest.
+
+Usage:
+    python benchmarks/sensor_scoring_bench.py [--model models/sensor_fire_model.pkl] [--samples 2000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sensor_scoring import SENSOR_FEATURES, SENSOR_MODEL_PATH, load_sensor_scorer  # noqa: E402
+
+
+def random_readings(n, seed=42):
+    """
+    Synthetic readings spread around and beyond the thresholds used to label the training data.
+    """
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "co": float(rng.uniform(0.0, 0.04)),
+            "humidity": float(rng.uniform(10.0, 90.0)),
+            "lpg": float(rng.uniform(0.0, 0.02)),
+            "smoke": float(rng.uniform(0.0, 0.05)),
+            "temp": float(rng.uniform(0.0, 120.0)),
+        }
+        for _ in range(n)
+    ]
+
+
+def sklearn_single(sensor_model, reading):
+    # The path calculate_sensor_confidence used before the compiled forest
+    features = pd.DataFrame([[reading[name] for name in SENSOR_FEATURES]], columns=SENSOR_FEATURES)
+    return sensor_model.predict_proba(features)[0][1] * 100
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--model', default=SENSOR_MODEL_PATH)
+    parser.add_argument('--samples', type=int, default=2000)
+    parser.add_argument('--single-calls', type=int, default=200)
+    args = parser.parse_args()
+
+    sensor_model, scorer = load_sensor_scorer(args.model)
+    readings = random_readings(args.samples)
+    single = readings[:args.single_calls]
+
+    # Correctness: compiled probabilities must match predict_proba
+    expected = sensor_model.predict_proba(pd.DataFrame(
+        [[r[name] for name in SENSOR_FEATURES] for r in readings], columns=SENSOR_FEATURES))
+    actual = scorer.predict_proba(scorer.features_from_readings(readings))
+    max_diff = float(np.abs(expected - actual).max())
+
+    sklearn_time, _ = timed(lambda: [sklearn_single(sensor_model, r) for r in single], 1)
+    compiled_time, _ = timed(lambda: [scorer.score_one(r) for r in single], 1)
+    sklearn_batch_time, _ = timed(lambda: sensor_model.predict_proba(
+        pd.DataFrame([[r[name] for name in SENSOR_FEATURES] for r in readings], columns=SENSOR_FEATURES)), 3)
+    compiled_batch_time, _ = timed(lambda: scorer.score(readings), 3)
+
+    per_single_sklearn = sklearn_time / len(single) * 1e6
+    per_single_compiled = compiled_time / len(single) * 1e6
+    print(f"Trees: {len(scorer.roots)}, nodes: {len(scorer.feature)}, max depth: {scorer.max_depth}")
+    print(f"Max |predict_proba - compiled|: {max_diff:.3e}")
+    print(f"Single reading   sklearn+pandas: {per_single_sklearn:10.1f} us/call")
+    print(f"Single reading   compiled:       {per_single_compiled:10.1f} us/call "
+          f"({per_single_sklearn / per_single_compiled:.1f}x)")
+    print(f"Batch of {len(readings):<6}  sklearn+pandas: {sklearn_batch_time * 1e3:10.2f} ms")
+    print(f"Batch of {len(readings):<6}  compiled:       {compiled_batch_time * 1e3:10.2f} ms "
+          f"({sklearn_batch_time / compiled_batch_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Startup-time check: how long a fresh process takes to import the app and build it with create_app(),
+and which heavy modules the import pulls in.
+
+Usage:
+    python benchmarks/startup_bench.py [--runs 5] [--budget 2.0] [--ready] [--output startup.json]
+
+Exits with status 1 if the median import + create_app() time exceeds the budget (STARTUP_BUDGET_SECONDS by
+default) or a heavy module is imported before it is needed, so it can run in CI. With --ready it also starts the
+background initialization and reports how long the process takes until /ready returns 200.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from startup import STARTUP_BUDGET_SECONDS  # noqa: E402
+
+# Modules that must not be imported until the subsystem using them is initialized
+HEAVY_MODULES = ['torch', 'ultralytics', 'pandas', 'sklearn', 'joblib', 'firebase_admin', 'twilio']
+
+CHILD_SCRIPT = '''
+import json, sys, time
+start_time = time.perf_counter()
+import fire_detection_inference as app_module
+app = app_module.create_app(preload={preload})
+created = time.perf_counter() - start_time
+heavy = [name for name in {heavy!r} if name in sys.modules]
+ready = None
+if {preload}:
+    client = app.test_client()
+    deadline = time.perf_counter() + {timeout}
+    while time.perf_counter() < deadline:
+        if client.get('/ready').status_code == 200:
+            ready = time.perf_counter() - start_time
+            break
+        time.sleep(0.05)
+print(json.dumps({{"created_seconds": created, "heavy_modules": heavy, "ready_seconds": ready}}))
+'''
+
+
+def run_child(preload, timeout):
+    script = CHILD_SCRIPT.format(preload=preload, heavy=HEAVY_MODULES, timeout=timeout)
+    start_time = time.perf_counter()
+    process = subprocess.run([sys.executable, '-c', script], cwd=REPO_ROOT, capture_output=True, text=True,
+                             timeout=timeout + 60)
+    wall_seconds = time.perf_counter() - start_time
+    lines = process.stdout.strip().splitlines()
+    if process.returncode != 0 or not lines:
+        raise RuntimeError((process.stderr.strip().splitlines() or ["unknown error"])[-1])
+    result = json.loads(lines[-1])
+    result["process_seconds"] = wall_seconds
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app startup time against a budget")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET_SECONDS,
+                        help="Seconds allowed for import + create_app()")
+    parser.add_argument('--ready', action='store_true', help="Also measure the time until /ready returns 200")
+    parser.add_argument('--ready-timeout', type=float, default=300.0)
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    runs = [run_child(False, 0) for _ in range(max(1, args.runs))]
+    created = statistics.median(run["created_seconds"] for run in runs)
+    process = statistics.median(run["process_seconds"] for run in runs)
+    heavy = sorted({name for run in runs for name in run["heavy_modules"]})
+    print(f"import + create_app(): median {created * 1000:.0f} ms (budget {args.budget * 1000:.0f} ms), "
+          f"whole process {process * 1000:.0f} ms")
+    print(f"Heavy modules imported eagerly: {', '.join(heavy) if heavy else 'none'}")
+
+    report = {"budget_seconds": args.budget, "created_seconds_median": created,
+              "process_seconds_median": process, "heavy_modules": heavy, "runs": runs}
+    if args.ready:
+        ready_run = run_child(True, args.ready_timeout)
+        report["ready_seconds"] = ready_run["ready_seconds"]
+        if ready_run["ready_seconds"] is None:
+            print(f"/ready did not return 200 within {args.ready_timeout:.0f}s")
+        else:
+            print(f"Time until /ready: {ready_run['ready_seconds']:.2f}s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if created > args.budget or heavy:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+import os
+from collections import deque
+from threading import Lock
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+from mjpeg_broadcaster import MJPEG_JPEG_QUALITY
+from sensor_scoring import SENSOR_FEATURES
+
+load_dotenv()
+
+# Processed frames remembered per stream; the oldest are overwritten (each takes HISTORY_DTYPE.itemsize bytes)
+HISTORY_SIZE = int(os.getenv("HISTORY_SIZE", "36000"))
+# Upper bound on points returned by one /history query; longer ranges are downsampled to fit
+HISTORY_MAX_POINTS = int(os.getenv("HISTORY_MAX_POINTS", "1000"))
+# Annotated JPEG keyframes kept from before and after each raised alert
+HISTORY_KEYFRAMES_BEFORE = int(os.getenv("HISTORY_KEYFRAMES_BEFORE", "3"))
+HISTORY_KEYFRAMES_AFTER = int(os.getenv("HISTORY_KEYFRAMES_AFTER", "3"))
+# Seconds between keyframes around an alert
+HISTORY_KEYFRAME_INTERVAL = float(os.getenv("HISTORY_KEYFRAME_INTERVAL", "1.0"))
+# Keyframes kept per stream; the oldest are dropped first
+HISTORY_MAX_KEYFRAMES = int(os.getenv("HISTORY_MAX_KEYFRAMES", "60"))
+
+# Bit position of each alert rule in the 'alerts' field; defined here and stored in the ring buffer, so append only
+ALERT_NAMES = ['fire', 'sensor', 'adjusted']
+
+HISTORY_DTYPE = np.dtype([
+    ('timestamp', np.float64),
+    ('fire_confidence', np.float32),
+    ('smoke_confidence', np.float32),
+    ('fire_boxes', np.uint16),
+    ('smoke_boxes', np.uint16),
+    # Sensor readings in SENSOR_FEATURES order, NaN when no fresh reading was available
+    ('sensor', np.float32, (len(SENSOR_FEATURES),)),
+    ('sensor_confidence', np.float32),
+    ('adjusted_confidence', np.float32),
+    ('alerts', np.uint8),
+    # False when the motion gate skipped inference and the detections were carried forward
+    ('inferred', np.bool_),
+])
+
+# How each field is combined when consecutive records are merged into one point
+_AGGREGATES = {
+    'timestamp': np.minimum,
+    'fire_confidence': np.maximum,
+    'smoke_confidence': np.maximum,
+    'fire_boxes': np.maximum,
+    'smoke_boxes': np.maximum,
+    'sensor_confidence': np.maximum,
+    'adjusted_confidence': np.maximum,
+    'alerts': np.bitwise_or,
+    'inferred': np.logical_or,
+}
+
+_NO_SENSORS = (np.nan,) * len(SENSOR_FEATURES)
+
+
+def downsample(records, rows_per_point):
+    """
+    Merge every `rows_per_point` consecutive records into one.
+    Confidences and box counts keep their peak, alerts any raised bit, timestamps the first, and sensor
+    readings their mean, so short spikes survive downsampling.
+    """
+    starts = np.arange(0, len(records), rows_per_point)
+    points = np.empty(len(starts), dtype=HISTORY_DTYPE)
+    for name, ufunc in _AGGREGATES.items():
+        points[name] = ufunc.reduceat(records[name], starts)
+    sensor = records['sensor']
+    valid = ~np.isnan(sensor)
+    with np.errstate(invalid='ignore'):
+        points['sensor'] = (np.add.reduceat(np.where(valid, sensor, 0), starts, axis=0)
+                            / np.add.reduceat(valid, starts, axis=0))
+    return points
+
+
+def records_to_dict(records):
+    """
+    Columnar, JSON-serializable form of history records.
+    """
+    def column(values, decimals):
+        values = np.round(values.astype(np.float64), decimals)
+        return np.where(np.isnan(values), None, values).tolist()
+
+    return {
+        "timestamp": column(records['timestamp'], 3),
+        "fire_confidence": column(records['fire_confidence'], 2),
+        "smoke_confidence": column(records['smoke_confidence'], 2),
+        "fire_boxes": records['fire_boxes'].tolist(),
+        "smoke_boxes": records['smoke_boxes'].tolist(),
+        "sensor": {name: column(records['sensor'][:, i], 4) for i, name in enumerate(SENSOR_FEATURES)},
+        "sensor_confidence": column(records['sensor_confidence'], 2),
+        "adjusted_confidence": column(records['adjusted_confidence'], 2),
+        "alerts": {name: ((records['alerts'] >> i) & 1).astype(bool).tolist() for i, name in enumerate(ALERT_NAMES)},
+        "inferred": records['inferred'].tolist(),
+    }
+
+
+class DetectionHistory:
+    """
+    Fixed-size history of one stream's per-frame results in a NumPy structured ring buffer.
+    Recording a frame writes one row in place; memory use is set by HISTORY_SIZE and never grows.
+    Records are kept in capture order, so range queries are binary searches on the two contiguous
+    halves of the ring and read only the requested rows.
+
+    Around each raised alert a few annotated JPEG keyframes are kept: the last HISTORY_KEYFRAMES_BEFORE
+    frames sampled before it, the frame that raised it and HISTORY_KEYFRAMES_AFTER frames after it.
+    Frames before an alert are held by reference and only drawn and encoded if an alert follows.
+    """
+
+    def __init__(self, size=HISTORY_SIZE, renderer=None, keyframes_before=HISTORY_KEYFRAMES_BEFORE,
+                 keyframes_after=HISTORY_KEYFRAMES_AFTER, keyframe_interval=HISTORY_KEYFRAME_INTERVAL,
+                 max_keyframes=HISTORY_MAX_KEYFRAMES, jpeg_quality=MJPEG_JPEG_QUALITY):
+        """
+        :param renderer: Optional callable(frame, overlay) returning the annotated frame, as for FrameBroadcaster
+        """
+        self.records = np.zeros(max(1, size), dtype=HISTORY_DTYPE)
+        self.renderer = renderer
+        self.keyframes_after = keyframes_after
+        self.keyframe_interval = keyframe_interval
+        self.jpeg_quality = jpeg_quality
+        self.recorded = 0
+        self._lock = Lock()
+        self._alert_bits = 0
+        # (timestamp, frame, overlay) sampled every keyframe_interval, encoded only if an alert follows
+        self._recent = deque(maxlen=max(0, keyframes_before))
+        self._last_sampled = None
+        self._pending_after = 0
+        self._pending_alerts = []
+        self._keyframes = deque(maxlen=max(1, max_keyframes))
+        self._next_keyframe_id = 0
+
+    @property
+    def size(self):
+        return len(self.records)
+
+    def record(self, timestamp, detections, sensor_data, sensor_confidence, adjusted_confidence, alerts_active,
+               inferred=True, frame=None, overlay=None):
+        """
+        Append the results of one processed frame.
+        :param timestamp: time.time() at which the frame was captured; a timestamp earlier than the previous record
+                          (the wall clock stepped back) is stored as the previous one, so queries can binary-search
+        :param alerts_active: Dictionary of {rule_name: active} from AlertEvaluator.evaluate()
+        :param frame: The processed frame, used for keyframes; the caller must not modify it afterwards
+        :param overlay: Data passed to the renderer when the frame becomes a keyframe
+        """
+        bits = 0
+        for i, name in enumerate(ALERT_NAMES):
+            if alerts_active.get(name):
+                bits |= 1 << i
+        sensor = tuple(sensor_data.get(name, np.nan) for name in SENSOR_FEATURES) if sensor_data else _NO_SENSORS
+        row = (detections.fire_confidence, detections.smoke_confidence, detections.fire_count,
+               detections.smoke_count, sensor, sensor_confidence, adjusted_confidence, bits, inferred)
+        with self._lock:
+            if self.recorded:
+                timestamp = max(timestamp, float(self.records[(self.recorded - 1) % len(self.records)]['timestamp']))
+            self.records[self.recorded % len(self.records)] = (timestamp,) + row
+            self.recorded += 1
+
+        raised = bits & ~self._alert_bits
+        self._alert_bits = bits
+        if frame is not None:
+            self._update_keyframes(timestamp, frame, overlay, raised)
+
+    def _update_keyframes(self, timestamp, frame, overlay, raised):
+        due = self._last_sampled is None or timestamp - self._last_sampled >= self.keyframe_interval
+        if raised:
+            alerts = [name for i, name in enumerate(ALERT_NAMES) if raised & (1 << i)]
+            for sample in self._recent:
+                self._add_keyframe(*sample, alerts, 'before')
+            self._recent.clear()
+            self._add_keyframe(timestamp, frame, overlay, alerts, 'alert')
+            self._pending_after = self.keyframes_after
+            self._pending_alerts = alerts
+        elif not due:
+            return
+        elif self._pending_after:
+            self._add_keyframe(timestamp, frame, overlay, self._pending_alerts, 'after')
+            self._pending_after -= 1
+        else:
+            self._recent.append((timestamp, frame, overlay))
+        self._last_sampled = timestamp
+
+    def _add_keyframe(self, timestamp, frame, overlay, alerts, position):
+        if self.renderer is not None and overlay is not None:
+            frame = self.renderer(frame.copy(), overlay)
+        ok, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+        if not ok:
+            return
+        with self._lock:
+            self._keyframes.append({
+                "id": self._next_keyframe_id,
+                "timestamp": timestamp,
+                "alerts": alerts,
+                "position": position,
+                "jpeg": buffer.tobytes(),
+            })
+            self._next_keyframe_id += 1
+
+    def _segments(self):
+        # Filled part of the ring as oldest-first views
+        head = self.recorded % len(self.records)
+        if self.recorded <= len(self.records):
+            return [self.records[:self.recorded]]
+        return [segment for segment in (self.records[head:], self.records[:head]) if len(segment)]
+
+    def query(self, start=None, end=None, max_points=HISTORY_MAX_POINTS):
+        """
+        Records captured between `start` and `end` (inclusive, either may be None), oldest first.
+        :param max_points: Ranges with more records are downsampled to at most this many points, see downsample()
+        :return: Tuple of (records array, records in the range, records merged per point)
+        """
+        with self._lock:
+            parts = []
+            for segment in self._segments():
+                times = segment['timestamp']
+                first = 0 if start is None else np.searchsorted(times, start, 'left')
+                last = len(segment) if end is None else np.searchsorted(times, end, 'right')
+                if last > first:
+                    parts.append(segment[first:last])
+            rows = sum(len(part) for part in parts)
+            if not parts:
+                return np.zeros(0, dtype=HISTORY_DTYPE), 0, 1
+            # Each ring half is merged separately, which can leave one partial point per half
+            rows_per_point = max(1, -(-rows // max(1, max_points - len(parts) + 1)))
+            if rows_per_point == 1:
+                return np.concatenate(parts), rows, 1
+            return np.concatenate([downsample(part, rows_per_point) for part in parts]), rows, rows_per_point
+
+    def keyframes(self, start=None, end=None):
+        """
+        :return: Keyframe metadata (without the JPEG bytes) between `start` and `end`, oldest first
+        """
+        with self._lock:
+            return [{key: value for key, value in keyframe.items() if key != 'jpeg'}
+                    for keyframe in self._keyframes
+                    if (start is None or keyframe["timestamp"] >= start)
+                    and (end is None or keyframe["timestamp"] <= end)]
+
+    def keyframe_jpeg(self, keyframe_id):
+        """
+        :return: JPEG bytes of a keyframe, or None if it was never taken or has been dropped
+        """
+        with self._lock:
+            for keyframe in self._keyframes:
+                if keyframe["id"] == keyframe_id:
+                    return keyframe["jpeg"]
+        return None
+
+    def stats(self):
+        with self._lock:
+            segments = self._segments()
+            return {
+                "size": len(self.records),
+                "records": min(self.recorded, len(self.records)),
+                "recorded": self.recorded,
+                "oldest": float(segments[0]['timestamp'][0]) if self.recorded else None,
+                "newest": float(segments[-1]['timestamp'][-1]) if self.recorded else None,
+                "memory_bytes": self.records.nbytes,
+                "keyframes": len(self._keyframes),
+            }
@@ -0,0 +1,169 @@
+import json
+import os
+
+import cv2
+import numpy as np
+
+# Per-model metadata, keyed by model file name
+MODEL_METADATA_PATH = 'models/model_metadata.json'
+# Class IDs used by models without an entry in the metadata file
+DEFAULT_CLASS_MAP = {0: 'fire', 1: 'smoke'}
+
+# Label codes used in Detections.labels
+FIRE = 0
+SMOKE = 1
+OTHER = -1
+_LABEL_CODES = {'fire': FIRE, 'smoke': SMOKE}
+
+FIRE_COLOR = (0, 0, 255)
+SMOKE_COLOR = (255, 0, 0)
+
+
+def load_model_metadata(model_path, metadata_path=MODEL_METADATA_PATH):
+    """
+    Metadata declared for a model file in `metadata_path`, or an empty dict.
+    """
+    if not os.path.exists(metadata_path):
+        return {}
+    with open(metadata_path) as f:
+        metadata = json.load(f)
+    return metadata.get(os.path.basename(model_path), {})
+
+
+def load_class_map(model_path, metadata_path=MODEL_METADATA_PATH):
+    """
+    Mapping of class ID to 'fire' / 'smoke' for a model.
+    :return: Dictionary of {class_id: label}
+    """
+    class_map = load_model_metadata(model_path, metadata_path).get('class_map')
+    if not class_map:
+        return dict(DEFAULT_CLASS_MAP)
+    return {int(class_id): label for class_id, label in class_map.items()}
+
+
+def class_lookup(class_map):
+    """
+    Turn a class map into an array indexed by class ID holding label codes, for vectorized mapping.
+    """
+    lookup = np.full(max(class_map) + 1 if class_map else 1, OTHER, dtype=np.int8)
+    for class_id, label in class_map.items():
+        lookup[class_id] = _LABEL_CODES.get(label, OTHER)
+    return lookup
+
+
+class Detections:
+    """
+    Fire and smoke boxes found in one frame.
+    """
+
+    def __init__(self, boxes, confidences, labels):
+        """
+        :param boxes: Array of shape (N, 4) with x1, y1, x2, y2
+        :param confidences: Array of shape (N,)
+        :param labels: Array of shape (N,) with FIRE, SMOKE or OTHER codes
+        """
+        self.boxes = boxes
+        self.confidences = confidences
+        self.labels = labels
+        self.fire_mask = labels == FIRE
+        self.smoke_mask = labels == SMOKE
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int8))
+
+    @property
+    def fire_count(self):
+        return int(np.count_nonzero(self.fire_mask))
+
+    @property
+    def smoke_count(self):
+        return int(np.count_nonzero(self.smoke_mask))
+
+    @property
+    def fire_detected(self):
+        return bool(self.fire_mask.any())
+
+    @property
+    def smoke_detected(self):
+        return bool(self.smoke_mask.any())
+
+    @property
+    def fire_confidence(self):
+        """
+        Average confidence of the fire boxes as a percentage, 0.0 when there are none.
+        """
+        if not self.fire_mask.any():
+            return 0.0
+        return float(self.confidences[self.fire_mask].mean() * 100)
+
+    @property
+    def smoke_confidence(self):
+        """
+        Average confidence of the smoke boxes as a percentage, 0.0 when there are none.
+        """
+        if not self.smoke_mask.any():
+            return 0.0
+        return float(self.confidences[self.smoke_mask].mean() * 100)
+
+
+def postprocess(detections, lookup):
+    """
+    Split raw YOLO output into fire and smoke boxes with NumPy masks.
+    :param detections: Array of shape (N, 6) with x1, y1, x2, y2, confidence, class_id
+    :param lookup: Array from class_lookup() for the model that produced `detections`
+    """
+    if len(detections) == 0:
+        return Detections.empty()
+    class_ids = detections[:, 5].astype(np.intp)
+    known = (class_ids >= 0) & (class_ids < len(lookup))
+    labels = np.where(known, lookup[np.where(known, class_ids, 0)], OTHER).astype(np.int8)
+    return Detections(detections[:, :4], detections[:, 4], labels)
+
+
+def _box_iou(box, boxes):
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return intersection / np.maximum(area + areas - intersection, 1e-6)
+
+
+def merge_detections(detections_list, iou_threshold=0.5):
+    """
+    Combine detections from overlapping views of the same frame (e.g. a full-frame pass and tiles).
+    Boxes of the same label that overlap by more than `iou_threshold` are reduced to the most confident one.
+    All inputs must already be in the same coordinates.
+    """
+    boxes = np.concatenate([d.boxes for d in detections_list]).astype(np.float32)
+    if len(boxes) == 0:
+        return Detections.empty()
+    confidences = np.concatenate([d.confidences for d in detections_list]).astype(np.float32)
+    labels = np.concatenate([d.labels for d in detections_list]).astype(np.int8)
+
+    keep = []
+    for label in np.unique(labels):
+        order = np.flatnonzero(labels == label)
+        order = order[np.argsort(-confidences[order], kind='stable')]
+        while order.size:
+            best, order = order[0], order[1:]
+            keep.append(best)
+            if order.size:
+                order = order[_box_iou(boxes[best], boxes[order]) <= iou_threshold]
+    keep = np.sort(np.array(keep, dtype=np.intp))
+    return Detections(boxes[keep], confidences[keep], labels[keep])
+
+
+def annotate_detections(frame, detections):
+    """
+    Draw fire and smoke boxes onto `frame` in place.
+    """
+    for label, color, name in ((FIRE, FIRE_COLOR, "Fire"), (SMOKE, SMOKE_COLOR, "Smoke")):
+        mask = detections.labels == label
+        for (x1, y1, x2, y2), conf in zip(detections.boxes[mask].astype(int), detections.confidences[mask]):
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+            cv2.putText(frame, f"{name}: {conf:.2f}", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    return frame
@@ -1,172 +1,277 @@
-from flask import Flask, Response, request, render_template_string, jsonify
+# Imported first so the startup budget covers every other import
+from startup import STARTED_AT, StartupTimer, Subsystem
+from flask import Blueprint, Flask, Response, request, render_template_string, jsonify
 import cv2
 import os
-from ultralytics import YOLO
-from threading import Thread
 import numpy as np
 import time  # Add this import for measuring time
 from dotenv import load_dotenv
-import joblib
-import firebase_admin
-from firebase_admin import credentials, db
-import pandas as pd
 from flask_cors import CORS  # Add this import
-from twilio_alerts import check_thresholds_and_alert  # Import the alert utility
+from twilio_alerts import dispatcher as alert_dispatcher  # Import the alert utility
+from alert_rules import AlertEvaluator, SensorAlertMonitor, fuse_confidence
+from status_events import STATUS_PUSH_MAX_RATE, StatusBroadcaster
+from stream_manager import StreamManager
+from inference_scheduler import InferenceScheduler
+from pipeline import AdaptiveFrameSkipper, Pipeline
+from motion_gate import MotionGate
+from tiling import TiledDetector, parse_regions
+from detection_history import HISTORY_MAX_POINTS, records_to_dict
+from video_source import VideoSource
+from mjpeg_broadcaster import MJPEG_MAX_FPS, encode_mjpeg_part
+from sensor_cache import SENSOR_LOCATION, SensorCache, create_sensor_source
+from sensor_scoring import SENSOR_MODEL_PATH, load_sensor_scorer
+from detections import Detections, annotate_detections, postprocess
+from metrics import (
+    CAPTURE_CONNECTED, CAPTURE_FRAME_AGE_SECONDS, CAPTURE_RECONNECTS, FRAME_LATENCY_SECONDS, FRAME_SKIP,
+    INFERENCE_QUEUE_DEPTH, MJPEG_SUBSCRIBERS, MODEL_LOAD_SECONDS, MODEL_WARMUP_SECONDS, MOTION_SKIPPED_FRAMES,
+    PIPELINE_DROPPED_FRAMES, PIPELINE_QUEUE_DEPTH, SENSOR_MODEL_READY, STAGE_SECONDS, STATUS_SUBSCRIBERS, metrics,
+)
+from model_registry import ModelRegistry
+from inference_backends import load_inference_model
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Get the Firebase key path from the environment variable
-firebase_key_path = os.getenv("FIREBASE_KEY_PATH")
+# Nothing heavy happens at import: models, Firebase and Twilio are initialized on first use,
+# or in the background by create_app(), so the module imports quickly and without credentials
+startup_timer = StartupTimer()
 
-# Initialize Firebase Admin SDK
-if firebase_key_path:
-    cred = credentials.Certificate(firebase_key_path)
-    firebase_admin.initialize_app(cred, {
-        'databaseURL': 'https://fire-detection-system-29797-default-rtdb.asia-southeast1.firebasedatabase.app/'  # Replace with your Firebase Realtime Database URL
-    })
-else:
-    raise ValueError("FIREBASE_KEY_PATH environment variable not set.")
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app)  # Enable CORS for the Flask app
-
-# Global variables
-output_frame = None
-video_thread = None
-stop_thread = False
-model = None
-# Load the trained sensor model
-sensor_model = joblib.load('models/sensor_fire_model.pkl')
+# Sensor readings are polled in the background (Firebase by default, see SENSOR_BACKEND)
+sensor_cache = SensorCache(create_sensor_source())
+
+# Routes are registered on the app built by create_app()
+bp = Blueprint('fire_detection', __name__)
+
+# Loaded YOLO models, each on the fastest (or pinned) inference backend; the active one is swapped between batches
+model_registry = ModelRegistry(load_inference_model)
+# The trained sensor model, compiled into NumPy arrays for fast scoring
+sensor_scorer = Subsystem('sensor_model', lambda: load_sensor_scorer(SENSOR_MODEL_PATH)[1])
+# Twilio client of the alert dispatcher
+alert_client = Subsystem('alerts', lambda: alert_dispatcher.client)
 current_model_path = 'models/best.pt'
 
-# Global variables for JSON response
-fire_confidence = 0.0
-smoke_detected_status = False
+# Frames are resized to this resolution before inference
+PROCESS_WIDTH = int(os.getenv("PROCESS_WIDTH", "640"))
+PROCESS_HEIGHT = int(os.getenv("PROCESS_HEIGHT", "360"))
+
+# Registry of active camera streams; every stream shares the active YOLO model
+DEFAULT_STREAM_ID = 'default'
+DEFAULT_LOCATION = 'Lab 607'
+stream_manager = StreamManager()
+# Pushes status changes of every stream to /events clients
+status_broadcaster = StatusBroadcaster()
+# The sensor alert rule runs on every sensor poll, so it does not depend on a camera stream being up
+sensor_alerts = SensorAlertMonitor(lambda reading: calculate_sensor_confidence(reading), SENSOR_LOCATION)
+sensor_cache.add_listener(sensor_alerts.update)
+
+def load_model(model_path, background=False):
+    """
+    Make `model_path` the active YOLO model, loading and warming it up if it is not cached.
+    :return: True if the model is active when this returns
+    """
+    return model_registry.activate(model_path, background=background)
+
+def predict_batch(frames):
+    """
+    Run the active YOLO model once on a batch of frames.
+    Post-processing is left to each stream (see detect_fire) so it is timed per stream.
+    :return: List of (boxes array, class lookup) tuples, one per frame
+    """
+    return model_registry.predict_raw(frames)
 
-def load_model(model_path):
-    global model
-    try:
-        model = YOLO(model_path)
-        print(f"Model loaded successfully: {model_path}")
-    except Exception as e:
-        print(f"Error loading model: {e}")
+# Frames from every stream are batched into shared predict calls
+inference_scheduler = InferenceScheduler(predict_batch)
 
-def detect_fire(frame):
-    global current_model_path, fire_confidence, smoke_detected_status
+def detect_fire(frame, stream_id=DEFAULT_STREAM_ID):
+    """
+    Run the YOLO model on a frame. Nothing is drawn; see annotate_detections().
+    The frame goes through the shared inference scheduler so it is batched with other streams.
+    :return: Detections for the frame
+    """
     try:
-        results = model.predict(frame, verbose=False)
-        detections = results[0].boxes.data.cpu().numpy()
-        fire_detected = False
-        smoke_detected_status = False
-        total_confidence = 0
-        fire_count = 0
-
-        for *box, conf, cls in detections:
-            if int(cls) == 0:  # Assuming '0' is the class ID for fire
-                if 'best.pt' in current_model_path:  # Flip annotations for best.pt
-                    smoke_detected_status = True
-                    x1, y1, x2, y2 = map(int, box)
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
-                    cv2.putText(frame, f"Smoke: {conf:.2f}", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
-                else:
-                    fire_detected = True
-                    fire_count += 1
-                    total_confidence += conf
-                    x1, y1, x2, y2 = map(int, box)
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
-                    cv2.putText(frame, f"Fire: {conf:.2f}", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-            elif int(cls) == 1:  # Assuming '1' is the class ID for smoke
-                if 'best.pt' in current_model_path:  # Flip annotations for best.pt
-                    fire_detected = True
-                    fire_count += 1
-                    total_confidence += conf
-                    x1, y1, x2, y2 = map(int, box)
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
-                    cv2.putText(frame, f"Fire: {conf:.2f}", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-                else:
-                    smoke_detected_status = True
-                    x1, y1, x2, y2 = map(int, box)
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
-                    cv2.putText(frame, f"Smoke: {conf:.2f}", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
-
-        # Calculate average confidence for fire detection
-        fire_confidence = (total_confidence / fire_count) * 100 if fire_count > 0 else 0.0
-
-        return frame, fire_detected, smoke_detected_status
+        with metrics.timer(STAGE_SECONDS, stream=stream_id, stage='inference'):
+            boxes, lookup = inference_scheduler.predict(stream_id, frame)
+        with metrics.timer(STAGE_SECONDS, stream=stream_id, stage='postprocess'):
+            return postprocess(boxes, lookup)
     except Exception as e:
         print(f"Error in detect_fire: {e}")
-        fire_confidence = 0.0
-        smoke_detected_status = False
-        return frame, False, False
-
-def process_video(input_source):
-    global output_frame, stop_thread
-    print(f"Attempting to open video source: {input_source}")
-    cap = cv2.VideoCapture(input_source)
-    if not cap.isOpened():
-        print(f"Error: Unable to open video source: {input_source}")
-        return
-
-    frame_skip = 2
-    frame_count = 0
-    prev_time = time.time()  # Initialize time for FPS calculation
-
-    print("Video capture started")
-    while not stop_thread:
-        ret, frame = cap.read()
-        if not ret:
-            print("Error: Failed to read frame from video source. Stopping thread.")
-            break
-
-        frame_count += 1
-        if frame_count % frame_skip != 0:
-            continue
-
-        start_time = time.time()  # Start time for processing
-        frame = cv2.resize(frame, (640, 360))
-        processed_frame, fire_detected, smoke_detected = detect_fire(frame)
-        end_time = time.time()  # End time for processing
+        return Detections.empty()
 
-        # Calculate real-time FPS
-        fps = 1 / (end_time - prev_time)
-        prev_time = end_time
-
-        # Fetch live sensor data from Firebase
-        sensor_data = fetch_sensor_data()
-        sensor_confidence = 0.0
-        if sensor_data:
-            sensor_confidence = calculate_sensor_confidence(sensor_data)
-
-        # Add FPS counter, fire confidence, and sensor confidence to the frame
-        cv2.putText(processed_frame, f"FPS: {fps:.2f}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-        cv2.putText(processed_frame, f"Fire Confidence: {fire_confidence:.2f}%", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-        cv2.putText(processed_frame, f"Sensor Confidence: {sensor_confidence:.2f}%", (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-
-        output_frame = processed_frame
+def detect_fire_batch(frames, stream_id=DEFAULT_STREAM_ID):
+    """
+    Run the YOLO model on several frames (e.g. the tiles of one frame).
+    All frames are queued before waiting, so the scheduler runs them in one predict call.
+    :return: List of Detections, one per frame
+    """
+    futures = [inference_scheduler.submit(stream_id, frame) for frame in frames]
+    results = []
+    for future in futures:
+        try:
+            boxes, lookup = future.result()
+            results.append(postprocess(boxes, lookup))
+        except Exception as e:
+            print(f"Error in detect_fire_batch: {e}")
+            results.append(Detections.empty())
+    return results
 
-    cap.release()
-    print("Video capture released")
+def render_overlay(frame, overlay):
+    """
+    Draw detections and the FPS / confidence text onto a frame.
+    Only called when the frame is encoded for an MJPEG viewer or kept as an alert keyframe.
+    """
+    annotate_detections(frame, overlay["detections"])
+    cv2.putText(frame, f"FPS: {overlay['fps']:.2f}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    cv2.putText(frame, f"Fire Confidence: {overlay['fire_confidence']:.2f}%", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+    cv2.putText(frame, f"Sensor Confidence: {overlay['sensor_confidence']:.2f}%", (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+    return frame
 
-def generate_feed():
-    global output_frame
-    # Fallback image if no frame is available
-    fallback_frame = np.zeros((360, 640, 3), dtype=np.uint8)
-    cv2.putText(fallback_frame, "No Video Feed Available", (50, 180), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+def process_video(stream):
+    """
+    Run the detection pipeline for a stream until it is stopped or its source ends.
+    Capture, preprocess, inference and render each run in their own thread, connected by
+    bounded queues that drop the oldest frame, so a slow stage only ever sees the freshest frames.
+    Inference is skipped on frames where the scene has not changed; their status and overlay reuse
+    the detections of the last frame that was inferred.
+    """
+    input_source = stream.input_source
+    print(f"[{stream.stream_id}] Attempting to open video source: {input_source}")
+    # Opened by the capture stage; a live source that drops out is reconnected instead of ending the stream
+    source = VideoSource(input_source, stream.stream_id, stream.stop_event)
+    stream.capture = source
+
+    # Frame skipping follows the measured inference time instead of a fixed factor
+    frame_skipper = AdaptiveFrameSkipper()
+    motion_gate = MotionGate()
+    # Full-resolution tiles over the stream's regions of interest (and, in adaptive mode, around coarse detections)
+    tiler = TiledDetector(detect_fire_batch, stream.roi)
+    last_detections = Detections.empty()
+    alert_evaluator = AlertEvaluator(stream.location, sensor_monitor=sensor_alerts)
+    stream.alert_evaluator = alert_evaluator
+    stream.broadcaster.renderer = render_overlay
+    stream.history.renderer = render_overlay
+    prev_time = time.monotonic()  # Initialize time for FPS calculation
+
+    def capture():
+        # Frames the skipper passes over are grabbed but never decoded
+        result = source.read(frame_skipper.record_frame)
+        if result is None:
+            print(f"[{stream.stream_id}] Video source {source.state}. Stopping thread.")
+            return None
+        frame, captured_monotonic = result
+        # Monotonic time for latency measurement; wall-clock time of the same instant for status and alerts
+        captured_at = time.time() - (time.monotonic() - captured_monotonic)
+        return {"frame": frame, "captured_at": captured_at, "captured_monotonic": captured_monotonic}
+
+    def preprocess(item):
+        if tiler.active:
+            item["source"] = item["frame"]
+        with metrics.timer(STAGE_SECONDS, stream=stream.stream_id, stage='resize'):
+            item["frame"] = cv2.resize(item["frame"], (PROCESS_WIDTH, PROCESS_HEIGHT))
+        return item
+
+    def inference(item):
+        nonlocal last_detections
+        # Checked here rather than earlier so frames dropped between stages never become the reference
+        with metrics.timer(STAGE_SECONDS, stream=stream.stream_id, stage='motion'):
+            infer = motion_gate.check(item["frame"])
+        if not infer:
+            # Static scene: carry the previous detections forward
+            item["detections"] = last_detections
+            item["inferred"] = False
+            metrics.inc(MOTION_SKIPPED_FRAMES, stream=stream.stream_id)
+            return item
+        start_time = time.time()  # Start time for processing
+        if tiler.active:
+            with metrics.timer(STAGE_SECONDS, stream=stream.stream_id, stage='tiles'):
+                detections = tiler.detect(item["frame"], item.pop("source"), stream.stream_id)
+        else:
+            detections = detect_fire(item["frame"], stream.stream_id)
+        item["detections"] = last_detections = detections
+        item["inferred"] = True
+        frame_skipper.record_inference(time.time() - start_time)
+        motion_gate.record_detections(last_detections)
+        return item
+
+    def render(item):
+        nonlocal prev_time
+        end_time = time.time()
+
+        # Calculate real-time FPS on the monotonic clock; the guard keeps a coarse timer from dividing by zero
+        now = time.monotonic()
+        fps = 1 / max(now - prev_time, 1e-6)
+        prev_time = now
+
+        # Latest cached sensor readings; never waits on Firebase
+        with metrics.timer(STAGE_SECONDS, stream=stream.stream_id, stage='sensor_fetch'):
+            sensor_data = fetch_sensor_data()
+            sensor_confidence = 0.0
+            if sensor_data:
+                sensor_confidence = calculate_sensor_confidence(sensor_data)
+
+        # Fuse camera and sensor confidence and check the camera and fused thresholds on every processed frame
+        detections = item["detections"]
+        fire_confidence = detections.fire_confidence
+        adjusted_confidence = fuse_confidence(fire_confidence, sensor_confidence)
+        with metrics.timer(STAGE_SECONDS, stream=stream.stream_id, stage='alert'):
+            alerts_active = alert_evaluator.evaluate(fire_confidence, adjusted_confidence, item["captured_at"])
+
+        status = build_status(stream.stream_id, fire_confidence, detections.smoke_detected,
+                              sensor_data, sensor_confidence, adjusted_confidence, True)
+        status.update(alerts_active=alerts_active, captured_at=item["captured_at"], updated_at=end_time)
+        stream.state.update(status)
+        status_broadcaster.publish(stream.stream_id, status)
+        metrics.observe(FRAME_LATENCY_SECONDS, time.monotonic() - item["captured_monotonic"], stream=stream.stream_id)
+
+        overlay = {
+            "detections": detections,
+            "fps": fps,
+            "fire_confidence": fire_confidence,
+            "sensor_confidence": sensor_confidence,
+        }
+        with metrics.timer(STAGE_SECONDS, stream=stream.stream_id, stage='history'):
+            stream.history.record(item["captured_at"], detections, sensor_data, sensor_confidence,
+                                  adjusted_confidence, alerts_active, item["inferred"], item["frame"], overlay)
+
+        # Boxes and text are only drawn if someone is watching the MJPEG stream
+        stream.broadcaster.publish(item["frame"], overlay)
+        return None
 
+    stream.pipeline = Pipeline(
+        f"stream-{stream.stream_id}",
+        capture,
+        [("preprocess", preprocess), ("inference", inference), ("render", render)],
+        stream.stop_event,
+    )
+    stream.frame_skipper = frame_skipper
+    stream.motion_gate = motion_gate
+    stream.tiler = tiler
+
+    print(f"[{stream.stream_id}] Video capture started")
+    stream.pipeline.run()
+
+    source.release()
+    stream.broadcaster.close()
+    print(f"[{stream.stream_id}] Video capture released")
+
+# Fallback image if no frame is available, encoded once and shared by all viewers
+fallback_frame = np.zeros((360, 640, 3), dtype=np.uint8)
+cv2.putText(fallback_frame, "No Video Feed Available", (50, 180), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+FALLBACK_PART = encode_mjpeg_part(fallback_frame)
+
+def generate_feed(stream_id, max_fps=MJPEG_MAX_FPS):
     while True:
-        frame_to_send = output_frame if output_frame is not None else fallback_frame
-        try:
-            _, buffer = cv2.imencode('.jpg', frame_to_send)
-            frame = buffer.tobytes()
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-        except Exception as e:
-            print(f"Error in generate_feed: {e}")
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + cv2.imencode('.jpg', fallback_frame)[1].tobytes() + b'\r\n')
+        # Look the stream up on every pass so a restarted stream is picked up
+        stream = stream_manager.get(stream_id)
+        if stream is None or stream.broadcaster.closed:
+            yield FALLBACK_PART
+            time.sleep(1.0)
+            continue
+        if stream.broadcaster.sequence == 0:
+            yield FALLBACK_PART
+        # Blocks until the stream publishes new frames; returns once the stream stops
+        yield from stream.broadcaster.subscribe(max_fps)
 
-@app.route('/')
+@bp.route('/')
 def index():
     model_files = [f for f in os.listdir('models') if f.endswith('.pt')]
     return render_template_string('''
@@ -176,6 +281,12 @@ def index():
         <form id="startForm" method="post" onsubmit="startDetection(event)">
             <label for="input_source">Input Source (Video file path or ESP32-CAM URL):</label><br>
             <input type="text" id="input_source" name="input_source" required><br><br>
+            <label for="stream_id">Stream ID:</label><br>
+            <input type="text" id="stream_id" name="stream_id" value="default"><br><br>
+            <label for="location">Location:</label><br>
+            <input type="text" id="location" name="location" value="Lab 607"><br><br>
+            <label for="roi">Regions of Interest (optional, x,y,w,h as fractions, separated by ;):</label><br>
+            <input type="text" id="roi" name="roi" placeholder="0.6,0.0,0.4,0.3"><br><br>
             <label for="model_selector">Select Model:</label><br>
             <select id="model_selector" name="model_selector" onchange="changeModel(this.value)">
                 {% for model in models %}
@@ -188,9 +299,13 @@ def index():
         <div id="streamContainer" style="display: none;">
             <h2>Live Output Stream:</h2>
             <img id="videoFeed" src="" style="width: 640px; height: 360px;" alt="Video Stream">
-            <p>Direct Stream URL: <a href="/video_feed" target="_blank">/video_feed</a></p>
+            <p>Direct Stream URL: <a id="streamLink" href="/video_feed" target="_blank">/video_feed</a></p>
         </div>
         <script>
+            function streamId() {
+                return encodeURIComponent(document.getElementById('stream_id').value || 'default');
+            }
+
             function startDetection(event) {
                 event.preventDefault();
                 const form = document.getElementById('startForm');
@@ -204,7 +319,10 @@ def index():
                         const streamContainer = document.getElementById('streamContainer');
                         const videoFeed = document.getElementById('videoFeed');
                         const stopButton = document.getElementById('stopButton');
-                        videoFeed.src = '/video_feed';
+                        const streamLink = document.getElementById('streamLink');
+                        videoFeed.src = '/video_feed/' + streamId();
+                        streamLink.href = videoFeed.src;
+                        streamLink.textContent = '/video_feed/' + streamId();
                         streamContainer.style.display = 'block';
                         stopButton.style.display = 'inline-block';
                     } else {
@@ -214,7 +332,7 @@ def index():
             }
 
             function stopDetection() {
-                fetch('/stop')
+                fetch('/stop/' + streamId())
                     .then(response => response.json())
                     .then(data => {
                         alert(data.message);
@@ -238,28 +356,95 @@ def index():
         </script>
     ''', models=model_files, current_model=os.path.basename(current_model_path))
 
-@app.route('/start', methods=['POST'])
+@bp.route('/start', methods=['POST'])
 def start_detection():
-    global video_thread, stop_thread
     input_source = request.form['input_source']
-    print(f"Starting detection with input source: {input_source}")
-
-    if video_thread and video_thread.is_alive():
-        stop_thread = True
-        video_thread.join()
-
-    stop_thread = False
-    video_thread = Thread(target=process_video, args=(input_source,))
-    video_thread.daemon = True
-    video_thread.start()
-
-    return '', 200  # Return a simple success response
+    stream_id = request.form.get('stream_id') or DEFAULT_STREAM_ID
+    location = request.form.get('location') or DEFAULT_LOCATION
+    try:
+        roi = parse_regions(request.form.get('roi'))
+    except ValueError as e:
+        return jsonify({"message": f"Invalid roi: {e}"}), 400
+    print(f"Starting detection on stream '{stream_id}' at {location} with input source: {input_source}")
+
+    # Starting an existing stream ID replaces its source; other streams keep running
+    stream_manager.start(stream_id, input_source, process_video, location, roi)
+
+    return jsonify({"stream_id": stream_id}), 200
+
+@bp.route('/video_feed', defaults={'stream_id': DEFAULT_STREAM_ID})
+@bp.route('/video_feed/<stream_id>')
+def video_feed(stream_id):
+    # Viewers may ask for a lower frame rate, but never more than MJPEG_MAX_FPS
+    max_fps = request.args.get('fps', MJPEG_MAX_FPS, type=float)
+    if not 0 < max_fps <= MJPEG_MAX_FPS:
+        max_fps = MJPEG_MAX_FPS
+    return Response(generate_feed(stream_id, max_fps), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@bp.route('/streams')
+def list_streams():
+    return jsonify([stream.to_dict() for stream in stream_manager.list()])
+
+@bp.route('/sensors')
+def sensor_stats():
+    return jsonify(sensor_cache.stats())
+
+@bp.route('/alerts')
+def alert_stats():
+    return jsonify(dict(alert_dispatcher.get_stats(), sensor_rule=sensor_alerts.stats()))
+
+@bp.route('/inference_stats')
+def inference_stats():
+    return jsonify(inference_scheduler.stats())
+
+def _pipeline_samples(field):
+    samples = []
+    for stream in stream_manager.list():
+        if stream.pipeline is not None:
+            for stage, stage_stats in stream.pipeline.stats().items():
+                samples.append(({"stream": stream.stream_id, "stage": stage}, stage_stats[field]))
+    return samples
+
+def _model_samples(field):
+    return [({"model": os.path.basename(cached["path"]), "backend": cached["backend"]}, cached[field])
+            for cached in model_registry.stats()["cached"]]
+
+# Values that already live in the streams, scheduler and registry are read when /metrics is scraped
+metrics.register_callback(PIPELINE_QUEUE_DEPTH, lambda: _pipeline_samples("queue_depth"))
+metrics.register_callback(PIPELINE_DROPPED_FRAMES, lambda: _pipeline_samples("dropped"), metric_type='counter')
+metrics.register_callback(FRAME_SKIP, lambda: [({"stream": stream.stream_id}, stream.frame_skipper.skip)
+                                               for stream in stream_manager.list() if stream.frame_skipper])
+metrics.register_callback(CAPTURE_CONNECTED, lambda: [({"stream": stream.stream_id}, int(stream.capture.connected))
+                                                      for stream in stream_manager.list() if stream.capture])
+metrics.register_callback(CAPTURE_RECONNECTS, lambda: [({"stream": stream.stream_id}, stream.capture.reconnects)
+                                                       for stream in stream_manager.list() if stream.capture],
+                          metric_type='counter')
+metrics.register_callback(CAPTURE_FRAME_AGE_SECONDS, lambda: [
+    ({"stream": stream.stream_id}, time.monotonic() - stream.capture.last_frame_at)
+    for stream in stream_manager.list() if stream.capture and stream.capture.last_frame_at])
+metrics.register_callback(MJPEG_SUBSCRIBERS, lambda: [({"stream": stream.stream_id}, stream.broadcaster.subscribers)
+                                                      for stream in stream_manager.list()])
+metrics.register_callback(STATUS_SUBSCRIBERS, lambda: [({}, status_broadcaster.subscribers)])
+metrics.register_callback(SENSOR_MODEL_READY, lambda: [({}, int(sensor_scorer.ready))])
+metrics.register_callback(INFERENCE_QUEUE_DEPTH, lambda: [({}, inference_scheduler.queue_depth())])
+metrics.register_callback(MODEL_LOAD_SECONDS, lambda: _model_samples("load_seconds"))
+metrics.register_callback(MODEL_WARMUP_SECONDS, lambda: _model_samples("warmup_seconds"))
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    """
+    Stage timings, queue depths, dropped frames and Firebase / Twilio / model load latency in Prometheus format.
+    """
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
 
-@app.route('/video_feed')
-def video_feed():
-    return Response(generate_feed(), mimetype='multipart/x-mixed-replace; boundary=frame')
+@bp.route('/metrics/summary')
+def metrics_summary():
+    """
+    The same metrics as JSON, with mean and estimated p50 / p95 / p99 for every histogram.
+    """
+    return jsonify(metrics.summary())
 
-@app.route('/change_model', methods=['POST'])
+@bp.route('/change_model', methods=['POST'])
 def change_model():
     global current_model_path
     data = request.get_json()
@@ -267,120 +452,189 @@ def change_model():
 
     if model_path and os.path.exists(os.path.join('models', model_path)):
         current_model_path = os.path.join('models', model_path)
-        load_model(current_model_path)
-        return jsonify({"message": f"Model changed to {model_path}"})
+        # Recently used models switch instantly; others load in the background while the current one keeps serving
+        if load_model(current_model_path, background=True):
+            return jsonify({"message": f"Model changed to {model_path}"})
+        return jsonify({"message": f"Loading {model_path}; detection switches over once it is ready"}), 202
     else:
         return jsonify({"message": "Invalid model path"}), 400
 
-@app.route('/stop')
-def stop_detection():
-    global stop_thread, video_thread
-    stop_thread = True
-    if video_thread and video_thread.is_alive():
-        video_thread.join()
+@bp.route('/models')
+def model_stats():
+    return jsonify(model_registry.stats())
+
+@bp.route('/stop', defaults={'stream_id': DEFAULT_STREAM_ID})
+@bp.route('/stop/<stream_id>')
+def stop_detection(stream_id):
+    if not stream_manager.stop(stream_id):
+        return jsonify({"message": f"Stream '{stream_id}' is not running"}), 404
+    status_broadcaster.remove(stream_id)
     return jsonify({"message": "Fire detection stopped!"})
 
 def fetch_sensor_data():
     """
-    Fetch the latest sensor readings from Firebase Realtime Database.
-    :return: Dictionary with sensor readings
+    Get the latest sensor readings from the background sensor cache without blocking.
+    :return: Dictionary with sensor readings, or None if no fresh reading is available
     """
-    try:
-        # Replace 'sensor_data/latest' with the correct path in your Firebase database
-        ref = db.reference('sensors')  # Adjust the path as per your Firebase structure
-        sensor_data = ref.get()
-
-        #print("Fetched sensor data from Firebase:")
-        #print(sensor_data)
-        # Ensure the data is in the expected format
-        if sensor_data:
-            return {
-                "co": sensor_data.get("co", 0.0),
-                "humidity": sensor_data.get("humidity", 0.0),
-                "lpg": sensor_data.get("lpg", 0.0),
-                "smoke": sensor_data.get("smoke", 0.0),
-                "temp": sensor_data.get("temperature", 0.0)
-            }
-        else:
-            print("No sensor data found in Firebase.")
-            return None
-    except Exception as e:
-        print(f"Error fetching sensor data from Firebase: {e}")
-        return None
-
-
+    return sensor_cache.latest()
 
 
 def calculate_sensor_confidence(sensor_data):
     """
     Calculate fire confidence based on sensor readings using the trained model.
+    Uses the compiled forest, which gives the same probabilities as predict_proba without building a DataFrame.
     :param sensor_data: Dictionary with keys 'co', 'humidity', 'lpg', 'smoke', 'temp'
-    :return: Confidence percentage (0-100)
+    :return: Confidence percentage (0-100), or 0 while the sensor model is unavailable
     """
-    # Create a DataFrame with the same column names as the training data
-    feature_names = ['co', 'humidity', 'lpg', 'smoke', 'temp']  # Ensure these match the training data
-    features = pd.DataFrame([[
-        sensor_data['co'],
-        sensor_data['humidity'],
-        sensor_data['lpg'],
-        sensor_data['smoke'],
-        sensor_data['temp']
-    ]], columns=feature_names)
+    try:
+        return sensor_scorer.get().score_one(sensor_data)
+    except RuntimeError:
+        return 0.0
 
-    # Predict fire confidence
-    confidence = sensor_model.predict_proba(features)[0][1] * 100  # Probability of fire
-    return confidence
 
+@bp.route('/events', defaults={'stream_id': None})
+@bp.route('/events/<stream_id>')
+def status_events(stream_id):
+    """
+    Server-Sent Events stream of status changes, for one stream or all of them.
+    Replaces polling /status: every dashboard receives the same precomputed update.
+    """
+    max_rate = request.args.get('rate', STATUS_PUSH_MAX_RATE, type=float)
+    if not 0 < max_rate <= STATUS_PUSH_MAX_RATE:
+        max_rate = STATUS_PUSH_MAX_RATE
+    return Response(status_broadcaster.subscribe(stream_id, max_rate), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def build_status(stream_id, fire_confidence, smoke_detected, sensor_data, sensor_confidence,
+                 adjusted_confidence, output_frame_available):
+    """
+    Build the /status payload.
+    """
+    status = {
+        "stream_id": stream_id,
+        "fire_confidence": float(fire_confidence),  # Convert to Python float
+        "sensor_confidence": float(sensor_confidence),  # Convert to Python float
+        "adjusted_confidence": float(adjusted_confidence),  # Convert to Python float
+        "smoke_detected": bool(smoke_detected),
+        "output_frame_available": output_frame_available,
+        # False while the sensor model is loading or failed to load; sensor confidence is 0 until then
+        "sensor_model_ready": sensor_scorer.ready,
+    }
+    if sensor_data:
+        status["sensor_readings"] = sensor_data  # Include all real-time sensor readings
+    else:
+        status["error"] = "No sensor data available."
+    return status
 
-@app.route('/status', methods=['GET'])
-def get_status():
-    global fire_confidence, smoke_detected_status
+@bp.route('/status', methods=['GET'], defaults={'stream_id': DEFAULT_STREAM_ID})
+@bp.route('/status/<stream_id>', methods=['GET'])
+def get_status(stream_id):
+    """
+    Return the status precomputed by the stream's pipeline; alerts are evaluated there, not here.
+    """
+    stream = stream_manager.get(stream_id)
+    if stream is None and stream_id != DEFAULT_STREAM_ID:
+        return jsonify({"error": f"Unknown stream '{stream_id}'"}), 404
+
+    status = stream.state.snapshot() if stream is not None else None
+    if status is not None:
+        return jsonify(status)
+
+    # No processed frame yet: report the cached sensor readings only
+    sensor_data = fetch_sensor_data()
+    sensor_confidence = calculate_sensor_confidence(sensor_data) if sensor_data else 0.0
+    return jsonify(build_status(stream_id, 0.0, False, sensor_data, sensor_confidence,
+                                fuse_confidence(0.0, sensor_confidence), False))
+
+@bp.route('/history', defaults={'stream_id': DEFAULT_STREAM_ID})
+@bp.route('/history/<stream_id>')
+def get_history(stream_id):
+    """
+    Per-frame confidences, box counts, sensor readings, fused score and alerts of a stream between `start` and
+    `end` (Unix seconds), or over the `last` N seconds. Ranges with more than `points` frames are downsampled,
+    keeping the peak confidences of each merged group. Alert keyframes in the range are listed too.
+    """
+    stream = stream_manager.get(stream_id)
+    if stream is None:
+        return jsonify({"error": f"Unknown stream '{stream_id}'"}), 404
+
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    last = request.args.get('last', type=float)
+    if last is not None:
+        start = time.time() - last
+    max_points = request.args.get('points', HISTORY_MAX_POINTS, type=int)
+    max_points = min(max(max_points, 1), HISTORY_MAX_POINTS)
+
+    records, rows, rows_per_point = stream.history.query(start, end, max_points)
+    return jsonify({
+        "stream_id": stream_id,
+        "start": start,
+        "end": end,
+        "frames": rows,
+        "points": len(records),
+        "frames_per_point": rows_per_point,
+        "records": records_to_dict(records),
+        "keyframes": stream.history.keyframes(start, end),
+    })
 
-    try:
-        # Fetch live sensor data from Firebase
-        sensor_data = fetch_sensor_data()
-
-        if sensor_data:
-            # Calculate sensor confidence using the trained model
-            sensor_confidence = calculate_sensor_confidence(sensor_data)
-
-            # Adjusted confidence (weighted average)
-            adjusted_confidence = (fire_confidence * 0.7) + (sensor_confidence * 0.3)
-            
-            # Check thresholds and send alerts if necessary
-            location = request.args.get('location', 'Lab 607')
-            check_thresholds_and_alert(
-                fire_confidence=fire_confidence,
-                sensor_confidence=sensor_confidence,
-                adjusted_confidence=adjusted_confidence,
-                location=location
-            )
-
-            return jsonify({
-                "fire_confidence": float(fire_confidence),  # Convert to Python float
-                "sensor_confidence": float(sensor_confidence),  # Convert to Python float
-                "adjusted_confidence": float(adjusted_confidence),  # Convert to Python float
-                "smoke_detected": smoke_detected_status,
-                "output_frame_available": output_frame is not None,
-                "sensor_readings": sensor_data  # Include all real-time sensor readings
-            })
-        else:
-            return jsonify({
-                "fire_confidence": float(fire_confidence),  # Convert to Python float
-                "sensor_confidence": 0.0,
-                "adjusted_confidence": float(fire_confidence * 0.7),  # Convert to Python float
-                "smoke_detected": smoke_detected_status,
-                "output_frame_available": output_frame is not None,
-                "error": "No sensor data available."
-            }), 200
-    except Exception as e:
-        print(f"Error in /status endpoint: {e}")
-        return jsonify({
-            "error": "An error occurred while fetching the status.",
-            "details": str(e)
-        }), 500
+@bp.route('/history/<stream_id>/keyframes/<int:keyframe_id>')
+def get_keyframe(stream_id, keyframe_id):
+    """
+    An annotated JPEG keyframe taken around an alert, as listed by /history.
+    """
+    stream = stream_manager.get(stream_id)
+    jpeg = stream.history.keyframe_jpeg(keyframe_id) if stream is not None else None
+    if jpeg is None:
+        return jsonify({"error": f"Unknown keyframe {keyframe_id} of stream '{stream_id}'"}), 404
+    return Response(jpeg, mimetype='image/jpeg')
+
+@bp.route('/health')
+def health():
+    """
+    Liveness: the process is up and serving requests.
+    """
+    return jsonify({"status": "ok"})
+
+@bp.route('/ready')
+def readiness():
+    """
+    Readiness: 200 once the YOLO model and the sensor model are loaded, 503 until then.
+    """
+    active = model_registry.active
+    ready = active is not None and sensor_scorer.ready
+    return jsonify({
+        "ready": ready,
+        "model": {
+            "path": active.path if active else None,
+            "loading": model_registry.loading,
+            "error": model_registry.last_error,
+            "ready_after_seconds": active.loaded_at - STARTED_AT if active else None,
+        },
+        "sensor_model": sensor_scorer.value.metadata if sensor_scorer.ready else None,
+        "subsystems": {subsystem.name: subsystem.status() for subsystem in (sensor_scorer, alert_client)},
+        "sensors": sensor_cache.stats(),
+        "startup": startup_timer.stats(),
+    }), 200 if ready else 503
+
+def create_app(preload=True):
+    """
+    Build the Flask app.
+    Heavy subsystems are initialized on first use. With `preload`, the active YOLO model, the sensor model,
+    the Twilio client and the sensor poller start initializing in background threads right away, so the server
+    accepts requests immediately and /ready turns 200 once they are loaded.
+    """
+    app = Flask(__name__)
+    CORS(app)  # Enable CORS for the Flask app
+    app.register_blueprint(bp)
+    if preload:
+        load_model(current_model_path, background=True)
+        sensor_scorer.start()
+        alert_client.start()
+        sensor_cache.poller()
+    startup_timer.app_created()
+    return app
 
 
 if __name__ == "__main__":
-    load_model(current_model_path)
-    app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
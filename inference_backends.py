@@ -0,0 +1,222 @@
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 'auto' benchmarks the available backends on first load; any backend name pins it
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "auto").lower()
+# Timed predict calls per backend during the startup benchmark
+INFERENCE_BENCHMARK_RUNS = int(os.getenv("INFERENCE_BENCHMARK_RUNS", "5"))
+INFERENCE_IMAGE_SIZE = int(os.getenv("INFERENCE_IMAGE_SIZE", "640"))
+# Dataset YAML whose validation images calibrate the openvino_int8 export (empty = ultralytics' default, coco8)
+INFERENCE_INT8_DATA = os.getenv("INFERENCE_INT8_DATA", "")
+
+# Backends in order of preference when benchmark timings are equal
+BACKENDS = ['torch', 'onnx', 'openvino', 'openvino_int8']
+
+# Seconds after which an export lock file is taken to be left behind by a crashed process
+EXPORT_LOCK_TIMEOUT = 1800.0
+
+# Python packages each backend needs besides ultralytics
+_BACKEND_REQUIREMENTS = {
+    'torch': ['torch'],
+    'onnx': ['onnx', 'onnxruntime'],
+    'openvino': ['openvino'],
+    'openvino_int8': ['openvino', 'nncf'],
+}
+
+
+def available_backends():
+    """
+    Backends whose packages are installed.
+    openvino_int8 is only offered once INFERENCE_INT8_DATA is set, since the benchmark measures speed and not
+    the accuracy lost to calibrating on unrelated images.
+    """
+    return [
+        backend for backend in BACKENDS
+        if all(importlib.util.find_spec(module) is not None for module in _BACKEND_REQUIREMENTS[backend])
+        and (backend != 'openvino_int8' or INFERENCE_INT8_DATA)
+    ]
+
+
+def _export_prefix(model_path, content_hash):
+    directory = os.path.dirname(model_path)
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(directory, f"{stem}.{content_hash[:12]}")
+
+
+def export_path(model_path, content_hash, backend):
+    """
+    Location of the cached export of `model_path` for `backend`, next to the .pt file and keyed by its hash.
+    """
+    prefix = _export_prefix(model_path, content_hash)
+    if backend == 'onnx':
+        return prefix + '.onnx'
+    if backend == 'openvino':
+        return prefix + '_openvino_model'
+    if backend == 'openvino_int8':
+        return prefix + '_int8_openvino_model'
+    return model_path
+
+
+def _export(model_path, backend, target):
+    from ultralytics import YOLO
+
+    yolo = YOLO(model_path)
+    if backend == 'onnx':
+        exported = yolo.export(format='onnx', dynamic=True, imgsz=INFERENCE_IMAGE_SIZE)
+    elif backend == 'openvino':
+        exported = yolo.export(format='openvino', dynamic=True, imgsz=INFERENCE_IMAGE_SIZE)
+    elif backend == 'openvino_int8':
+        # Post-training quantization with NNCF: weights and activations of the conv layers become int8,
+        # with ranges calibrated on the dataset images; the detection head's box decoding stays in float
+        exported = yolo.export(format='openvino', int8=True, data=INFERENCE_INT8_DATA or None, dynamic=True,
+                               imgsz=INFERENCE_IMAGE_SIZE)
+    else:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    # Moved next to the target first and then renamed, so the target never exists half-written
+    temp_path = target + '.tmp'
+    _remove(temp_path)
+    shutil.move(str(exported), temp_path)
+    os.replace(temp_path, target)
+    print(f"Exported {model_path} for {backend}: {target}")
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def _export_once(model_path, backend, target):
+    """
+    Export unless `target` exists, holding `target`.lock so that threads or processes loading the same model
+    export it once instead of writing ultralytics' intermediate files at the same time.
+    """
+    lock_path = target + '.lock'
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > EXPORT_LOCK_TIMEOUT:
+                    print(f"Removing stale export lock {lock_path}")
+                    os.remove(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.5)
+    try:
+        if not os.path.exists(target):
+            _export(model_path, backend, target)
+    finally:
+        os.close(fd)
+        os.remove(lock_path)
+
+
+class BackendModel:
+    """
+    A YOLO model running on a specific backend, with the same predict() interface as ultralytics YOLO.
+    """
+
+    def __init__(self, yolo, backend):
+        self.yolo = yolo
+        self.backend = backend
+
+    def predict(self, frames, verbose=False):
+        return self.yolo.predict(frames, verbose=verbose)
+
+
+def load_backend(model_path, content_hash, backend):
+    """
+    Load `model_path` on `backend`, exporting it first if there is no cached export.
+    """
+    from ultralytics import YOLO
+
+    if backend == 'torch':
+        return BackendModel(YOLO(model_path), backend)
+
+    target = export_path(model_path, content_hash, backend)
+    if not os.path.exists(target):
+        _export_once(model_path, backend, target)
+    return BackendModel(YOLO(target, task='detect'), backend)
+
+
+def benchmark_backend(model, runs=INFERENCE_BENCHMARK_RUNS, shape=(360, 640, 3)):
+    """
+    Median seconds per predict call on a fixed random frame, after one untimed warmup call.
+    """
+    frame = np.random.default_rng(0).integers(0, 256, shape, dtype=np.uint8)
+    model.predict([frame])
+    timings = []
+    for _ in range(max(1, runs)):
+        start_time = time.perf_counter()
+        model.predict([frame])
+        timings.append(time.perf_counter() - start_time)
+    return float(np.median(timings))
+
+
+def select_backend(model_path, content_hash):
+    """
+    Pick the fastest available backend for this model on this machine.
+    The result is cached per host next to the model so later starts skip the benchmark.
+    :return: Tuple of (backend, loaded BackendModel or None)
+    """
+    host = f"{platform.node()}/{platform.machine()}/{os.cpu_count()}"
+    selection_path = _export_prefix(model_path, content_hash) + '.backend.json'
+    selections = {}
+    if os.path.exists(selection_path):
+        with open(selection_path) as f:
+            selections = json.load(f)
+    if host in selections:
+        return selections[host]['backend'], None
+
+    timings = {}
+    best_backend, best_model = 'torch', None
+    for backend in available_backends():
+        try:
+            model = load_backend(model_path, content_hash, backend)
+            timings[backend] = benchmark_backend(model)
+        except Exception as e:
+            print(f"Skipping inference backend {backend}: {e}")
+            continue
+        print(f"Inference backend {backend}: {timings[backend] * 1000:.1f} ms/frame")
+        if best_model is None or timings[backend] < timings[best_backend]:
+            best_backend, best_model = backend, model
+
+    if not timings:
+        return best_backend, None
+
+    selections[host] = {"backend": best_backend, "timings": timings, "selected_at": time.time()}
+    with open(selection_path, 'w') as f:
+        json.dump(selections, f, indent=2)
+    print(f"Selected inference backend for {model_path}: {best_backend}")
+    return best_backend, best_model
+
+
+def load_inference_model(model_path, content_hash, backend=INFERENCE_BACKEND):
+    """
+    Load a YOLO .pt model on the configured backend, or the fastest one when `backend` is 'auto'.
+    Falls back to PyTorch if the chosen backend cannot be loaded.
+    """
+    model = None
+    if backend == 'auto':
+        backend, model = select_backend(model_path, content_hash)
+    if model is not None:
+        return model
+    try:
+        return load_backend(model_path, content_hash, backend)
+    except Exception as e:
+        if backend == 'torch':
+            raise
+        print(f"Error loading inference backend {backend}, falling back to torch: {e}")
+        return load_backend(model_path, content_hash, 'torch')
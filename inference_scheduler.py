@@ -0,0 +1,183 @@
+import os
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future
+from queue import Empty, Queue
+from threading import Lock, Thread
+
+from dotenv import load_dotenv
+
+from metrics import INFERENCE_BATCH_SECONDS, INFERENCE_BATCH_SIZE, SIZE_BUCKETS, metrics
+
+load_dotenv()
+
+# Batching limits: a batch is sent as soon as it is full or the oldest frame has waited this long
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "8"))
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "15"))
+
+# Number of recent samples kept per stream for latency percentiles
+STATS_WINDOW = 500
+
+
+class _InferenceRequest:
+    def __init__(self, stream_id, frame):
+        self.stream_id = stream_id
+        self.frame = frame
+        self.submitted_at = time.perf_counter()
+        self.future = Future()
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class InferenceScheduler:
+    """
+    Central inference queue shared by all streams.
+    Frames submitted by the stream workers are grouped into batches and run through a single
+    `predict_fn` call; each result is handed back to the stream that submitted the frame.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=INFERENCE_MAX_BATCH_SIZE, max_wait_ms=INFERENCE_MAX_WAIT_MS):
+        """
+        :param predict_fn: Callable taking a list of frames and returning a list of results in the same order
+        :param max_batch_size: Maximum number of frames per predict call
+        :param max_wait_ms: Maximum time the first frame of a batch waits for more frames to arrive
+        """
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._queue = Queue()
+        self._thread = None
+        self._running = False
+        self._start_lock = Lock()
+
+        self._stats_lock = Lock()
+        self._latencies = defaultdict(lambda: deque(maxlen=STATS_WINDOW))
+        self._frame_counts = defaultdict(int)
+        self._batch_sizes = defaultdict(int)
+        self._batch_count = 0
+        self._frames_predicted = 0
+        self._predict_time = 0.0
+
+    def start(self):
+        with self._start_lock:
+            if self._running:
+                return
+            self._running = True
+            self._thread = Thread(target=self._run, name="inference-scheduler")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, stream_id, frame):
+        """
+        Queue a frame for inference.
+        :return: Future resolving to the predict result for this frame
+        """
+        if not self._running:
+            self.start()
+        request = _InferenceRequest(stream_id, frame)
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, stream_id, frame, timeout=None):
+        """
+        Queue a frame and block until its result is available.
+        """
+        return self.submit(stream_id, frame).result(timeout)
+
+    def _collect_batch(self):
+        try:
+            first = self._queue.get(timeout=0.5)
+        except Empty:
+            return []
+
+        batch = [first]
+        deadline = first.submitted_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    # Still take anything that is already waiting, without blocking
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while self._running:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+
+            start_time = time.perf_counter()
+            try:
+                results = self.predict_fn([request.frame for request in batch])
+            except Exception as e:
+                print(f"Error in batched inference: {e}")
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            end_time = time.perf_counter()
+
+            for request, result in zip(batch, results):
+                request.future.set_result(result)
+
+            self._record_batch(batch, end_time - start_time, end_time)
+
+    def _record_batch(self, batch, predict_time, finished_at):
+        metrics.observe(INFERENCE_BATCH_SECONDS, predict_time)
+        metrics.histogram(INFERENCE_BATCH_SIZE, SIZE_BUCKETS).observe(len(batch))
+        with self._stats_lock:
+            self._batch_count += 1
+            self._batch_sizes[len(batch)] += 1
+            self._frames_predicted += len(batch)
+            self._predict_time += predict_time
+            for request in batch:
+                self._latencies[request.stream_id].append(finished_at - request.submitted_at)
+                self._frame_counts[request.stream_id] += 1
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        """
+        Batch-size and per-stream latency statistics, for tuning the batch size and wait time.
+        """
+        with self._stats_lock:
+            streams = {}
+            for stream_id, latencies in self._latencies.items():
+                ordered = sorted(latencies)
+                streams[stream_id] = {
+                    "frames": self._frame_counts[stream_id],
+                    "latency_ms_mean": sum(ordered) / len(ordered) * 1000 if ordered else 0.0,
+                    "latency_ms_p50": _percentile(ordered, 50) * 1000,
+                    "latency_ms_p95": _percentile(ordered, 95) * 1000,
+                    "latency_ms_max": ordered[-1] * 1000 if ordered else 0.0,
+                }
+
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batch_count,
+                "frames": self._frames_predicted,
+                "mean_batch_size": self._frames_predicted / self._batch_count if self._batch_count else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "mean_predict_ms": self._predict_time / self._batch_count * 1000 if self._batch_count else 0.0,
+                "frames_per_second": self._frames_predicted / self._predict_time if self._predict_time else 0.0,
+                "cpu_count": os.cpu_count(),
+                "streams": streams,
+            }
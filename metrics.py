@@ -0,0 +1,241 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+
+# Latency buckets in seconds, from sub-millisecond stages up to slow network calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Buckets for counts such as batch sizes
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+# Metric names, with the help text served on /metrics
+STAGE_SECONDS = 'fire_stage_seconds'
+FRAME_LATENCY_SECONDS = 'fire_frame_latency_seconds'
+PIPELINE_QUEUE_DEPTH = 'fire_pipeline_queue_depth'
+PIPELINE_DROPPED_FRAMES = 'fire_pipeline_dropped_frames_total'
+FRAME_SKIP = 'fire_frame_skip'
+CAPTURE_SKIPPED_FRAMES = 'fire_capture_skipped_frames_total'
+CAPTURE_RECONNECTS = 'fire_capture_reconnects_total'
+CAPTURE_CONNECTED = 'fire_capture_connected'
+CAPTURE_FRAME_AGE_SECONDS = 'fire_capture_frame_age_seconds'
+MOTION_SKIPPED_FRAMES = 'fire_motion_skipped_frames_total'
+INFERENCE_BATCH_SIZE = 'fire_inference_batch_size'
+INFERENCE_BATCH_SECONDS = 'fire_inference_batch_seconds'
+INFERENCE_QUEUE_DEPTH = 'fire_inference_queue_depth'
+MODEL_LOAD_SECONDS = 'fire_model_load_seconds'
+MODEL_WARMUP_SECONDS = 'fire_model_warmup_seconds'
+SENSOR_READ_SECONDS = 'fire_sensor_read_seconds'
+SENSOR_READ_ERRORS = 'fire_sensor_read_errors_total'
+SENSOR_MODEL_READY = 'fire_sensor_model_ready'
+ALERT_SEND_SECONDS = 'fire_alert_send_seconds'
+ALERT_SEND_ERRORS = 'fire_alert_send_errors_total'
+MJPEG_SUBSCRIBERS = 'fire_mjpeg_subscribers'
+STATUS_SUBSCRIBERS = 'fire_status_subscribers'
+
+METRIC_HELP = {
+    STAGE_SECONDS: "Time spent in each processing stage per frame (capture, decode, resize, motion, inference, "
+                   "postprocess, tiles, sensor_fetch, alert, history, annotate, encode)",
+    FRAME_LATENCY_SECONDS: "Time from frame capture until its status is published",
+    PIPELINE_QUEUE_DEPTH: "Frames waiting in front of each pipeline stage",
+    PIPELINE_DROPPED_FRAMES: "Frames dropped in front of each pipeline stage because it was busy",
+    FRAME_SKIP: "Current adaptive frame skip factor",
+    CAPTURE_SKIPPED_FRAMES: "Frames grabbed from the source but skipped without being decoded",
+    CAPTURE_RECONNECTS: "Times a live video source was lost and reconnected",
+    CAPTURE_CONNECTED: "1 while a stream's video source is connected, 0 while it is reconnecting or down",
+    CAPTURE_FRAME_AGE_SECONDS: "Seconds since a stream's video source last delivered a frame",
+    MOTION_SKIPPED_FRAMES: "Frames whose inference was skipped because the scene had not changed",
+    INFERENCE_BATCH_SIZE: "Frames per batched predict call",
+    INFERENCE_BATCH_SECONDS: "Duration of batched predict calls",
+    INFERENCE_QUEUE_DEPTH: "Frames waiting for the inference scheduler",
+    MODEL_LOAD_SECONDS: "Time taken to load each cached model",
+    MODEL_WARMUP_SECONDS: "Time taken to warm up each cached model",
+    SENSOR_READ_SECONDS: "Duration of sensor source reads (Firebase requests with the firebase backend)",
+    SENSOR_READ_ERRORS: "Failed sensor source reads",
+    SENSOR_MODEL_READY: "1 once the sensor model is loaded, 0 while it is loading or failed (sensor confidence reads 0)",
+    ALERT_SEND_SECONDS: "Duration of Twilio message requests, including failed attempts",
+    ALERT_SEND_ERRORS: "Failed Twilio message requests, including retried attempts",
+    MJPEG_SUBSCRIBERS: "Connected MJPEG viewers",
+    STATUS_SUBSCRIBERS: "Connected /events clients",
+}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + (list(extra) if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items) + '}'
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram; observe() is a bisect and three additions under a lock.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def quantile(self, q):
+        """
+        Estimate a quantile by linear interpolation inside the bucket that contains it.
+        """
+        counts, _, count = self.snapshot()
+        if count == 0:
+            return 0.0
+        rank = q * count
+        cumulative = 0
+        for index, bucket_count in enumerate(counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class MetricsRegistry:
+    """
+    Process-wide store of histograms and counters keyed by metric name and labels, plus callbacks
+    that report gauges (queue depths and similar) when metrics are scraped.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        # name -> (type, {label_key: metric})
+        self._metrics = {}
+        # name -> (type, callback returning [(labels, value)])
+        self._callbacks = {}
+
+    def _get(self, metric_type, name, labels, factory):
+        key = _label_key(labels)
+        with self._lock:
+            family = self._metrics.get(name)
+            if family is None:
+                family = self._metrics[name] = (metric_type, {})
+            metric = family[1].get(key)
+            if metric is None:
+                metric = family[1][key] = factory()
+            return metric
+
+    def histogram(self, name, buckets=LATENCY_BUCKETS, **labels):
+        return self._get('histogram', name, labels, lambda: Histogram(buckets))
+
+    def counter(self, name, **labels):
+        return self._get('counter', name, labels, Counter)
+
+    def observe(self, name, value, **labels):
+        self.histogram(name, **labels).observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        self.counter(name, **labels).inc(amount)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """
+        Observe the duration of the `with` block in seconds.
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+    def register_callback(self, name, callback, metric_type='gauge'):
+        """
+        Report a metric whose values are read when metrics are scraped, such as queue depths.
+        :param callback: Returns a list of (labels_dict, value)
+        """
+        with self._lock:
+            self._callbacks[name] = (metric_type, callback)
+
+    def _collect(self):
+        with self._lock:
+            families = {name: (metric_type, dict(family)) for name, (metric_type, family) in self._metrics.items()}
+            callbacks = dict(self._callbacks)
+        for name, (metric_type, callback) in callbacks.items():
+            try:
+                samples = callback()
+            except Exception as e:
+                print(f"Error collecting metric {name}: {e}")
+                continue
+            families[name] = (metric_type, {_label_key(labels): value for labels, value in samples})
+        return families
+
+    def render_prometheus(self):
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for name, (metric_type, metrics) in sorted(self._collect().items()):
+            if name in METRIC_HELP:
+                lines.append(f"# HELP {name} {METRIC_HELP[name]}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, metric in sorted(metrics.items()):
+                if isinstance(metric, Histogram):
+                    counts, total, count = metric.snapshot()
+                    cumulative = 0
+                    for bucket, bucket_count in zip(metric.buckets + (float('inf'),), counts):
+                        cumulative += bucket_count
+                        le = '+Inf' if bucket == float('inf') else repr(bucket)
+                        lines.append(f"{name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {count}")
+                else:
+                    value = metric.value if isinstance(metric, Counter) else metric
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """
+        JSON-friendly summary: count, mean and estimated p50/p95/p99 for histograms, values otherwise.
+        """
+        result = {}
+        for name, (_, metrics) in sorted(self._collect().items()):
+            entries = []
+            for labels, metric in sorted(metrics.items()):
+                entry = dict(labels)
+                if isinstance(metric, Histogram):
+                    _, total, count = metric.snapshot()
+                    entry.update(count=count, mean=total / count if count else 0.0,
+                                 p50=metric.quantile(0.5), p95=metric.quantile(0.95), p99=metric.quantile(0.99))
+                else:
+                    entry["value"] = metric.value if isinstance(metric, Counter) else metric
+                entries.append(entry)
+            result[name] = entries
+        return result
+
+
+# Shared registry for the whole process
+metrics = MetricsRegistry()
@@ -0,0 +1,149 @@
+import os
+import time
+from threading import Condition, Lock
+
+import cv2
+from dotenv import load_dotenv
+
+from metrics import STAGE_SECONDS, metrics
+
+load_dotenv()
+
+# JPEG quality (0-100) used for the MJPEG stream
+MJPEG_JPEG_QUALITY = int(os.getenv("MJPEG_JPEG_QUALITY", "80"))
+# Upper bound on frames per second sent to each viewer
+MJPEG_MAX_FPS = float(os.getenv("MJPEG_MAX_FPS", "15"))
+# Resend the last frame after this many idle seconds so disconnected viewers are noticed
+MJPEG_KEEPALIVE_SECONDS = 5.0
+
+
+def encode_mjpeg_part(frame, jpeg_quality=MJPEG_JPEG_QUALITY):
+    """
+    Encode a frame as one part of a multipart/x-mixed-replace MJPEG response.
+    """
+    ok, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality])
+    if not ok:
+        raise ValueError("Failed to encode frame as JPEG")
+    jpeg = buffer.tobytes()
+    return (b'--frame\r\n'
+            b'Content-Type: image/jpeg\r\n'
+            b'Content-Length: ' + str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+
+
+class FrameBroadcaster:
+    """
+    Shares the latest processed frame of a stream with any number of MJPEG viewers.
+    Each published frame gets a sequence number and is annotated and JPEG-encoded at most once,
+    the first time a viewer asks for it; every viewer then receives the same bytes. Nothing is
+    drawn or encoded while nobody is watching.
+    """
+
+    def __init__(self, jpeg_quality=MJPEG_JPEG_QUALITY, renderer=None, stream_id=''):
+        """
+        :param renderer: Optional callable(frame, overlay) returning the frame to encode, used to draw annotations
+        :param stream_id: Label for the annotate / encode timings in /metrics
+        """
+        self.stream_id = stream_id
+        self.jpeg_quality = jpeg_quality
+        self.renderer = renderer
+        self.subscribers = 0
+        self.encoded_frames = 0
+        self._condition = Condition()
+        self._encode_lock = Lock()
+        self._frame = None
+        self._overlay = None
+        self._sequence = 0
+        self._part = None
+        self._part_sequence = 0
+        self._closed = False
+
+    @property
+    def sequence(self):
+        return self._sequence
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def publish(self, frame, overlay=None):
+        """
+        Make `frame` the latest frame and wake up waiting viewers.
+        The caller must not modify the frame afterwards.
+        :param overlay: Data passed to the renderer when (and only if) the frame gets encoded
+        """
+        with self._condition:
+            self._frame = frame
+            self._overlay = overlay
+            self._sequence += 1
+            self._condition.notify_all()
+
+    def close(self):
+        """
+        End all subscriptions, e.g. when the stream stops.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def _encoded_part(self, sequence, frame, overlay):
+        with self._encode_lock:
+            if self._part_sequence != sequence:
+                if self.renderer is not None and overlay is not None:
+                    with metrics.timer(STAGE_SECONDS, stream=self.stream_id, stage='annotate'):
+                        frame = self.renderer(frame.copy(), overlay)
+                with metrics.timer(STAGE_SECONDS, stream=self.stream_id, stage='encode'):
+                    self._part = encode_mjpeg_part(frame, self.jpeg_quality)
+                self._part_sequence = sequence
+                self.encoded_frames += 1
+            return self._part
+
+    def wait_for_part(self, last_sequence, timeout=None):
+        """
+        Block until a frame newer than `last_sequence` is published.
+        :return: Tuple of (sequence, mjpeg_part), or None on timeout or when closed
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._closed or self._sequence > last_sequence, timeout)
+            if self._closed or self._sequence <= last_sequence:
+                return None
+            sequence, frame, overlay = self._sequence, self._frame, self._overlay
+        # Encode outside the condition so publishing is never blocked by encoding
+        return sequence, self._encoded_part(sequence, frame, overlay)
+
+    def subscribe(self, max_fps=MJPEG_MAX_FPS):
+        """
+        Generator yielding MJPEG parts for one viewer, at most `max_fps` per second.
+        Frames published faster than that are coalesced to the latest one. Ends when the broadcaster is closed.
+        """
+        min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        last_sequence = 0
+        last_sent = time.monotonic()
+        with self._condition:
+            self.subscribers += 1
+        try:
+            while not self._closed:
+                started = time.monotonic()
+                result = self.wait_for_part(last_sequence, timeout=1.0)
+                if result is None:
+                    if self._part is not None and started - last_sent >= MJPEG_KEEPALIVE_SECONDS:
+                        last_sent = started
+                        yield self._part
+                    continue
+                last_sequence, part = result
+                last_sent = time.monotonic()
+                yield part
+
+                elapsed = time.monotonic() - started
+                if elapsed < min_interval:
+                    time.sleep(min_interval - elapsed)
+        finally:
+            with self._condition:
+                self.subscribers -= 1
+
+    def stats(self):
+        return {
+            "subscribers": self.subscribers,
+            "sequence": self._sequence,
+            "encoded_frames": self.encoded_frames,
+            "jpeg_quality": self.jpeg_quality,
+        }
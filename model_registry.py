@@ -0,0 +1,236 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from threading import Lock, Thread
+
+import numpy as np
+from dotenv import load_dotenv
+
+from detections import class_lookup, load_class_map, postprocess
+
+load_dotenv()
+
+# How many YOLO models stay loaded for instant switching
+MODEL_REGISTRY_SIZE = int(os.getenv("MODEL_REGISTRY_SIZE", "3"))
+# Dummy frames run through a new model before it goes live
+MODEL_WARMUP_FRAMES = int(os.getenv("MODEL_WARMUP_FRAMES", "2"))
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    SHA-256 of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class LoadedModel:
+    """
+    A loaded YOLO model together with the class map declared for its file.
+    """
+
+    def __init__(self, path, content_hash, model, load_seconds):
+        self.path = path
+        self.content_hash = content_hash
+        self.model = model
+        self.backend = getattr(model, 'backend', 'torch')
+        self.class_lookup = class_lookup(load_class_map(path))
+        self.load_seconds = load_seconds
+        self.warmup_seconds = 0.0
+        self.loaded_at = time.time()
+
+    @property
+    def key(self):
+        return (os.path.abspath(self.path), self.content_hash)
+
+    def predict_raw(self, frames):
+        """
+        Run the model once on a batch of frames without post-processing.
+        :return: List of (boxes array, class lookup) tuples, one per frame; see detections.postprocess()
+        """
+        results = self.model.predict(frames, verbose=False)
+        return [(result.boxes.data.cpu().numpy(), self.class_lookup) for result in results]
+
+    def predict(self, frames):
+        """
+        Run the model once on a batch of frames.
+        :return: List of Detections, one per frame
+        """
+        return [postprocess(boxes, lookup) for boxes, lookup in self.predict_raw(frames)]
+
+    def warmup(self, frames=MODEL_WARMUP_FRAMES, shape=(360, 640, 3)):
+        """
+        Pay lazy initialization costs up front with a batch of dummy frames.
+        """
+        if frames <= 0:
+            return
+        start_time = time.perf_counter()
+        self.predict([np.zeros(shape, dtype=np.uint8) for _ in range(frames)])
+        self.warmup_seconds = time.perf_counter() - start_time
+
+    def to_dict(self):
+        return {
+            "path": self.path,
+            "hash": self.content_hash,
+            "backend": self.backend,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "loaded_at": self.loaded_at,
+        }
+
+
+class ModelRegistry:
+    """
+    Keeps recently used models in memory, keyed by file path and content hash, with an LRU limit.
+    New models are loaded and warmed up in a background thread and then swapped in with a single
+    reference assignment; callers read `active` once per batch, so a swap always happens between batches.
+    """
+
+    def __init__(self, loader, max_models=MODEL_REGISTRY_SIZE, warmup_frames=MODEL_WARMUP_FRAMES):
+        """
+        :param loader: Callable taking a model path and its content hash and returning an object with a YOLO-style predict()
+        """
+        self.loader = loader
+        self.max_models = max(1, max_models)
+        self.warmup_frames = warmup_frames
+        self.active = None
+        self.loading = None
+        self.last_error = None
+        # Incremented by every activate() call; a load only becomes active if no newer request came in meanwhile
+        self._request = 0
+        self._models = OrderedDict()
+        # Hashes are cached per (path, mtime, size) so switching back does not re-read the file
+        self._hashes = {}
+        self._lock = Lock()
+
+    def _content_hash(self, path):
+        stat = os.stat(path)
+        signature = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        content_hash = self._hashes.get(signature)
+        if content_hash is None:
+            content_hash = file_hash(path)
+            self._hashes[signature] = content_hash
+        return content_hash
+
+    def _cached(self, path):
+        key = (os.path.abspath(path), self._content_hash(path))
+        with self._lock:
+            loaded = self._models.get(key)
+            if loaded:
+                self._models.move_to_end(key)
+            return loaded
+
+    def load(self, path):
+        """
+        Return the model for `path`, loading and warming it up if it is not cached.
+        The cache may exceed `max_models` until _evict() runs, so a new model is never evicted before it is activated.
+        """
+        loaded = self._cached(path)
+        if loaded:
+            return loaded
+
+        content_hash = self._content_hash(path)
+        start_time = time.perf_counter()
+        loaded = LoadedModel(path, content_hash, self.loader(path, content_hash), 0.0)
+        loaded.load_seconds = time.perf_counter() - start_time
+        loaded.warmup(self.warmup_frames)
+        print(f"Model loaded successfully: {path} on {loaded.backend} "
+              f"(load {loaded.load_seconds:.2f}s, warmup {loaded.warmup_seconds:.2f}s)")
+
+        with self._lock:
+            self._models[loaded.key] = loaded
+        return loaded
+
+    def _evict(self):
+        while len(self._models) > self.max_models:
+            for key, loaded in self._models.items():
+                # Never drop the model currently serving requests
+                if loaded is not self.active:
+                    del self._models[key]
+                    print(f"Model evicted from registry: {loaded.path}")
+                    break
+            else:
+                break
+
+    def _activate(self, path, request):
+        try:
+            loaded = self.load(path)
+            with self._lock:
+                # A newer request (e.g. a switch to a cached model) wins; this model just stays cached
+                if request == self._request:
+                    self.active = loaded
+                    self.last_error = None
+                else:
+                    print(f"Model {path} loaded, but a newer model change superseded it")
+                self._evict()
+        except Exception as e:
+            with self._lock:
+                if request == self._request:
+                    self.last_error = str(e)
+            print(f"Error loading model: {e}")
+        finally:
+            with self._lock:
+                if request == self._request:
+                    self.loading = None
+
+    def activate(self, path, background=True):
+        """
+        Make `path` the active model.
+        A cached model is swapped in immediately; otherwise it is loaded and warmed up first,
+        in a background thread when `background` is True, while the current model keeps serving.
+        Only the most recent call takes effect: a load that finishes after a later call is cached but not activated.
+        :return: True if the model is already active when this returns
+        """
+        with self._lock:
+            self._request += 1
+            request = self._request
+        try:
+            loaded = self._cached(path)
+        except OSError as e:
+            self.last_error = str(e)
+            print(f"Error loading model: {e}")
+            return False
+        if loaded:
+            with self._lock:
+                if request == self._request:
+                    self.active = loaded
+                    self.loading = None
+                    self.last_error = None
+                return self.active is loaded
+
+        with self._lock:
+            self.loading = path
+        if not background:
+            self._activate(path, request)
+            return self.active is not None and self.active.path == path
+
+        thread = Thread(target=self._activate, args=(path, request), name="model-loader")
+        thread.daemon = True
+        thread.start()
+        return False
+
+    def predict_raw(self, frames):
+        """
+        Run one batch on the active model; the model is looked up once per batch.
+        Post-processing is left to the caller so it can run (and be timed) per stream.
+        The class lookup travels with each result, so a model swap mid-flight cannot mislabel boxes.
+        """
+        active = self.active
+        if active is None:
+            raise RuntimeError("No model loaded")
+        return active.predict_raw(frames)
+
+    def stats(self):
+        with self._lock:
+            cached = [loaded.to_dict() for loaded in reversed(self._models.values())]
+        return {
+            "active": self.active.to_dict() if self.active else None,
+            "loading": self.loading,
+            "last_error": self.last_error,
+            "max_models": self.max_models,
+            "cached": cached,
+        }
@@ -0,0 +1,93 @@
+import os
+import time
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Skip YOLO on frames that look the same as the last frame it ran on
+MOTION_GATE_ENABLED = os.getenv("MOTION_GATE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Width of the grayscale thumbnail compared between frames
+MOTION_THUMBNAIL_WIDTH = int(os.getenv("MOTION_THUMBNAIL_WIDTH", "320"))
+# A thumbnail pixel counts as changed when its gray level moves by more than this
+MOTION_PIXEL_DELTA = int(os.getenv("MOTION_PIXEL_DELTA", "12"))
+# Fraction of changed thumbnail pixels that triggers inference
+MOTION_MIN_CHANGED = float(os.getenv("MOTION_MIN_CHANGED", "0.0005"))
+# Inference runs at least this often (seconds) even on a static scene
+MOTION_MAX_INTERVAL = float(os.getenv("MOTION_MAX_INTERVAL", "2.0"))
+
+
+class MotionGate:
+    """
+    Cheap change detector in front of detect_fire.
+    Each frame is reduced to a small blurred grayscale thumbnail and compared with the thumbnail of the
+    frame inference last ran on, not the previous frame, so slow changes such as thickening smoke add up
+    until they trigger. Inference also runs on every frame while fire or smoke is detected, and at least
+    every `max_interval` seconds regardless of motion.
+    """
+
+    def __init__(self, enabled=MOTION_GATE_ENABLED, thumbnail_width=MOTION_THUMBNAIL_WIDTH,
+                 pixel_delta=MOTION_PIXEL_DELTA, min_changed=MOTION_MIN_CHANGED, max_interval=MOTION_MAX_INTERVAL):
+        self.enabled = enabled
+        self.thumbnail_width = max(8, thumbnail_width)
+        self.pixel_delta = pixel_delta
+        self.min_changed = min_changed
+        self.max_interval = max_interval
+        self._reference = None
+        self._last_inference = None
+        self._detected = False
+        self.frames = 0
+        self.inferred = 0
+        self.last_changed = 0.0
+
+    def _thumbnail(self, frame):
+        height = max(1, round(frame.shape[0] * self.thumbnail_width / frame.shape[1]))
+        small = cv2.resize(frame, (self.thumbnail_width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        # Blur away sensor noise and compression artifacts so they do not count as motion
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def check(self, frame, now=None):
+        """
+        Decide whether inference should run on `frame`; if so, it becomes the new reference frame.
+        :return: True to run inference, False to carry the previous detections forward
+        """
+        now = time.monotonic() if now is None else now
+        self.frames += 1
+        if not self.enabled:
+            self.inferred += 1
+            return True
+
+        thumbnail = self._thumbnail(frame)
+        if self._reference is None or self._reference.shape != thumbnail.shape:
+            run = True
+        else:
+            diff = cv2.absdiff(thumbnail, self._reference)
+            self.last_changed = np.count_nonzero(diff > self.pixel_delta) / diff.size
+            run = (self._detected or self.last_changed >= self.min_changed
+                   or now - self._last_inference >= self.max_interval)
+
+        if run:
+            self._reference = thumbnail
+            self._last_inference = now
+            self.inferred += 1
+        return run
+
+    def record_detections(self, detections):
+        """
+        Call with the result of each inference; while fire or smoke is visible every frame is inferred.
+        """
+        self._detected = detections.fire_detected or detections.smoke_detected
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "frames": self.frames,
+            "inferred": self.inferred,
+            "skipped": self.frames - self.inferred,
+            "skip_ratio": (self.frames - self.inferred) / self.frames if self.frames else 0.0,
+            "last_changed": self.last_changed,
+            "max_interval": self.max_interval,
+        }
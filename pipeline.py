@@ -0,0 +1,180 @@
+import math
+import os
+import time
+from collections import deque
+from queue import Empty
+from threading import Condition, Thread
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Capacity of the queue between two pipeline stages
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "2"))
+
+# Bounds for the adaptive frame skip (1 = process every frame)
+FRAME_SKIP_MIN = int(os.getenv("FRAME_SKIP_MIN", "1"))
+FRAME_SKIP_MAX = int(os.getenv("FRAME_SKIP_MAX", "10"))
+
+# Marker passed down the pipeline when the source is exhausted
+_END = object()
+
+
+class DropOldestQueue:
+    """
+    Bounded queue whose put() discards the oldest item instead of blocking when full,
+    so consumers always receive the freshest data.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = max(1, maxsize)
+        self.dropped = 0
+        self._items = deque()
+        self._not_empty = Condition()
+
+    def put(self, item):
+        """
+        :return: True if an older item was dropped to make room
+        """
+        with self._not_empty:
+            dropped = len(self._items) >= self.maxsize
+            if dropped:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._not_empty.notify()
+            return dropped
+
+    def get(self, timeout=None):
+        """
+        :raises queue.Empty: If no item arrives within `timeout` seconds
+        """
+        with self._not_empty:
+            if not self._not_empty.wait_for(lambda: self._items, timeout):
+                raise Empty
+            return self._items.popleft()
+
+    def qsize(self):
+        with self._not_empty:
+            return len(self._items)
+
+
+class AdaptiveFrameSkipper:
+    """
+    Decides which source frames to process based on the measured inference time
+    relative to the interval between source frames.
+    """
+
+    def __init__(self, min_skip=FRAME_SKIP_MIN, max_skip=FRAME_SKIP_MAX, smoothing=0.2):
+        self.min_skip = max(1, min_skip)
+        self.max_skip = max(self.min_skip, max_skip)
+        self.smoothing = smoothing
+        self.skip = self.min_skip
+        self._frame_interval = None
+        self._inference_time = None
+        self._last_frame_time = None
+        self._frames_since_processed = 0
+
+    def _smooth(self, current, sample):
+        if current is None:
+            return sample
+        return current + self.smoothing * (sample - current)
+
+    def record_frame(self):
+        """
+        Call once per frame read from the source.
+        :return: True if this frame should be processed
+        """
+        now = time.perf_counter()
+        if self._last_frame_time is not None:
+            self._frame_interval = self._smooth(self._frame_interval, now - self._last_frame_time)
+        self._last_frame_time = now
+
+        self._frames_since_processed += 1
+        if self._frames_since_processed >= self.skip:
+            self._frames_since_processed = 0
+            return True
+        return False
+
+    def record_inference(self, seconds):
+        """
+        Call with the duration of each inference to update the skip factor.
+        """
+        self._inference_time = self._smooth(self._inference_time, seconds)
+        if self._frame_interval:
+            skip = math.ceil(self._inference_time / self._frame_interval)
+            self.skip = min(self.max_skip, max(self.min_skip, skip))
+
+
+class Pipeline:
+    """
+    Runs a source and a chain of stages in separate threads connected by bounded drop-oldest queues.
+    A slow stage therefore never blocks the stages before it; it just sees fewer, fresher items.
+    """
+
+    def __init__(self, name, source, stages, stop_event, queue_size=PIPELINE_QUEUE_SIZE):
+        """
+        :param source: Callable returning the next item, or None when the source is exhausted
+        :param stages: List of (stage_name, fn) tuples; fn(item) returns the item for the next stage or None to drop it
+        :param stop_event: threading.Event that stops every stage when set
+        """
+        self.name = name
+        self.source = source
+        self.stages = stages
+        self.stop_event = stop_event
+        self.queues = [DropOldestQueue(queue_size) for _ in stages]
+
+    def _run_source(self):
+        output = self.queues[0]
+        try:
+            while not self.stop_event.is_set():
+                item = self.source()
+                if item is None:
+                    break
+                output.put(item)
+        except Exception as e:
+            print(f"[{self.name}] Error in source stage: {e}")
+        finally:
+            output.put(_END)
+
+    def _run_stage(self, index):
+        stage_name, fn = self.stages[index]
+        input_queue = self.queues[index]
+        output_queue = self.queues[index + 1] if index + 1 < len(self.queues) else None
+
+        while not self.stop_event.is_set():
+            try:
+                item = input_queue.get(timeout=0.2)
+            except Empty:
+                continue
+            if item is _END:
+                break
+            try:
+                item = fn(item)
+            except Exception as e:
+                print(f"[{self.name}] Error in {stage_name} stage: {e}")
+                continue
+            if item is not None and output_queue is not None:
+                output_queue.put(item)
+
+        if output_queue is not None:
+            output_queue.put(_END)
+
+    def run(self):
+        """
+        Start all stages and block until the source is exhausted or the stop event is set.
+        """
+        threads = [Thread(target=self._run_source, name=f"{self.name}-source")]
+        for index, (stage_name, _) in enumerate(self.stages):
+            threads.append(Thread(target=self._run_stage, args=(index,), name=f"{self.name}-{stage_name}"))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def stats(self):
+        return {
+            stage_name: {"queue_depth": queue.qsize(), "dropped": queue.dropped}
+            for (stage_name, _), queue in zip(self.stages, self.queues)
+        }
@@ -0,0 +1,254 @@
+import json
+import os
+import time
+from threading import Event, Lock, Thread
+
+from dotenv import load_dotenv
+
+from metrics import SENSOR_READ_ERRORS, SENSOR_READ_SECONDS, metrics
+
+load_dotenv()
+
+# Where sensor readings come from: 'firebase', 'file' or 'memory'
+SENSOR_BACKEND = os.getenv("SENSOR_BACKEND", "firebase").lower()
+# JSON file read by the 'file' backend
+SENSOR_FILE_PATH = os.getenv("SENSOR_FILE_PATH", "datasets/sensors.json")
+# Database path holding the latest readings
+SENSOR_PATH = os.getenv("SENSOR_PATH", "sensors")
+# Location named in sensor alerts; the sensors are not tied to a camera stream, so it is set here
+SENSOR_LOCATION = os.getenv("SENSOR_LOCATION", "Lab 607")
+# Seconds between two reads of the same path
+SENSOR_POLL_INTERVAL = float(os.getenv("SENSOR_POLL_INTERVAL", "1.0"))
+# Readings older than this many seconds are treated as missing
+SENSOR_MAX_AGE = float(os.getenv("SENSOR_MAX_AGE", "10.0"))
+
+FIREBASE_DATABASE_URL = 'https://fire-detection-system-29797-default-rtdb.asia-southeast1.firebasedatabase.app/'  # Replace with your Firebase Realtime Database URL
+
+
+def normalize_sensor_data(sensor_data):
+    """
+    Map a raw sensor record to the feature names used by the sensor model.
+    :return: Dictionary with sensor readings, or None if the record is empty
+    """
+    if not sensor_data:
+        return None
+    return {
+        "co": sensor_data.get("co", 0.0),
+        "humidity": sensor_data.get("humidity", 0.0),
+        "lpg": sensor_data.get("lpg", 0.0),
+        "smoke": sensor_data.get("smoke", 0.0),
+        "temp": sensor_data.get("temperature", 0.0)
+    }
+
+
+class FirebaseSensorSource:
+    """
+    Reads sensor records from the Firebase Realtime Database.
+    firebase_admin is imported and initialized on the first read, in the poller thread,
+    so creating the source is free and a missing key shows up as a poller error instead of an import error.
+    """
+
+    def __init__(self, key_path=None, database_url=FIREBASE_DATABASE_URL):
+        self.key_path = key_path
+        self.database_url = database_url
+        self._db = None
+        self._lock = Lock()
+
+    def _connect(self):
+        import firebase_admin
+        from firebase_admin import credentials, db
+
+        key_path = self.key_path or os.getenv("FIREBASE_KEY_PATH")
+        if not firebase_admin._apps:
+            if not key_path:
+                raise ValueError("FIREBASE_KEY_PATH environment variable not set.")
+            cred = credentials.Certificate(key_path)
+            firebase_admin.initialize_app(cred, {'databaseURL': self.database_url})
+        return db
+
+    def read(self, path):
+        if self._db is None:
+            with self._lock:
+                if self._db is None:
+                    self._db = self._connect()
+        return self._db.reference(path).get()
+
+
+class FileSensorSource:
+    """
+    Offline stand-in for Firebase that reads records from a JSON file.
+    The file holds either the record itself or an object keyed by database path.
+    The file is re-parsed only when it changes on disk.
+    """
+
+    def __init__(self, file_path=SENSOR_FILE_PATH):
+        self.file_path = file_path
+        self._mtime = None
+        self._data = None
+
+    def read(self, path):
+        mtime = os.path.getmtime(self.file_path)
+        if mtime != self._mtime:
+            with open(self.file_path) as f:
+                self._data = json.load(f)
+            self._mtime = mtime
+        if isinstance(self._data, dict) and isinstance(self._data.get(path), dict):
+            return self._data[path]
+        return self._data
+
+
+class MemorySensorSource:
+    """
+    In-memory stand-in for Firebase; records are set directly with `set()`.
+    """
+
+    def __init__(self, records=None):
+        self._records = dict(records or {})
+        self._lock = Lock()
+
+    def set(self, path, record):
+        with self._lock:
+            self._records[path] = record
+
+    def read(self, path):
+        with self._lock:
+            return self._records.get(path)
+
+
+def create_sensor_source(backend=SENSOR_BACKEND):
+    if backend == 'firebase':
+        return FirebaseSensorSource()
+    if backend == 'file':
+        return FileSensorSource()
+    if backend == 'memory':
+        return MemorySensorSource()
+    raise ValueError(f"Unknown SENSOR_BACKEND: {backend}")
+
+
+class SensorPoller:
+    """
+    Background thread that polls one sensor path and caches the latest normalized reading.
+    """
+
+    def __init__(self, source, path, interval=SENSOR_POLL_INTERVAL, listeners=None):
+        """
+        :param listeners: Callables(reading, updated_at) run in the poller thread after each successful read
+        """
+        self.source = source
+        self.path = path
+        self.interval = interval
+        self.listeners = listeners if listeners is not None else []
+        # (reading, updated_at) replaced as a whole, so readers never see a reading with another poll's time
+        self.snapshot = (None, None)
+        self.polls = 0
+        self.errors = 0
+        self.last_error = None
+        self._stop_event = Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = Thread(target=self._run, name=f"sensor-poller-{self.path}")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+
+    def poll_once(self):
+        start_time = time.perf_counter()
+        try:
+            raw = self.source.read(self.path)
+            metrics.observe(SENSOR_READ_SECONDS, time.perf_counter() - start_time, path=self.path)
+            reading = normalize_sensor_data(raw)
+            self.polls += 1
+            if reading is None:
+                print(f"No sensor data found at '{self.path}'.")
+                return
+            updated_at = time.time()
+            self.snapshot = (reading, updated_at)
+        except Exception as e:
+            self.errors += 1
+            self.last_error = str(e)
+            metrics.inc(SENSOR_READ_ERRORS, path=self.path)
+            print(f"Error fetching sensor data from '{self.path}': {e}")
+            return
+        for listener in list(self.listeners):
+            try:
+                listener(reading, updated_at)
+            except Exception as e:
+                print(f"Error in sensor listener for '{self.path}': {e}")
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.poll_once()
+            self._stop_event.wait(self.interval)
+
+    def latest(self, max_age=SENSOR_MAX_AGE):
+        """
+        :return: The cached reading, or None if there is none or it is older than `max_age` seconds
+        """
+        reading, updated_at = self.snapshot
+        if reading is None or time.time() - updated_at > max_age:
+            return None
+        return reading
+
+    def stats(self):
+        updated_at = self.snapshot[1]
+        return {
+            "path": self.path,
+            "age_seconds": time.time() - updated_at if updated_at else None,
+            "polls": self.polls,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+
+
+class SensorCache:
+    """
+    Keeps one poller per sensor path so readers never wait on the network.
+    Pollers are started the first time a path is read.
+    """
+
+    def __init__(self, source, interval=SENSOR_POLL_INTERVAL, max_age=SENSOR_MAX_AGE):
+        self.source = source
+        self.interval = interval
+        self.max_age = max_age
+        self._pollers = {}
+        self._listeners = {}
+        self._lock = Lock()
+
+    def add_listener(self, callback, path=SENSOR_PATH):
+        """
+        Call `callback(reading, updated_at)` on every new reading of `path`. Does not start polling by itself.
+        """
+        with self._lock:
+            self._listeners.setdefault(path, []).append(callback)
+
+    def poller(self, path=SENSOR_PATH):
+        with self._lock:
+            poller = self._pollers.get(path)
+            if poller is None:
+                poller = SensorPoller(self.source, path, self.interval, self._listeners.setdefault(path, []))
+                self._pollers[path] = poller
+                poller.start()
+            return poller
+
+    def latest(self, path=SENSOR_PATH):
+        """
+        Non-blocking read of the latest reading for `path`.
+        :return: Dictionary with sensor readings, or None if missing or stale
+        """
+        return self.poller(path).latest(self.max_age)
+
+    def stop(self):
+        with self._lock:
+            pollers = list(self._pollers.values())
+            self._pollers.clear()
+        for poller in pollers:
+            poller.stop()
+
+    def stats(self):
+        with self._lock:
+            return [poller.stats() for poller in self._pollers.values()]
@@ -0,0 +1,181 @@
+import json
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# A pickled model, or a versioned artifact written by telemetryTrain.py: a version directory, or the
+# directory holding the versions, in which case the one named in its LATEST file is loaded
+SENSOR_MODEL_PATH = os.getenv("SENSOR_MODEL_PATH", "models/sensor_fire_model.pkl")
+# Model of a versioned artifact to score with: a device ID, or empty for the model over all devices
+SENSOR_MODEL_DEVICE = os.getenv("SENSOR_MODEL_DEVICE", "")
+SENSOR_MODELS_DIR = 'models/sensor'
+ALL_DEVICES_MODEL = 'all'
+SENSOR_FEATURES = ['co', 'humidity', 'lpg', 'smoke', 'temp']
+
+
+class CompiledForest:
+    """
+    A scikit-learn RandomForestClassifier flattened into NumPy arrays.
+    All trees are stored in one node table and evaluated together with array indexing,
+    so scoring one reading or a batch costs a handful of vectorized operations per tree level
+    instead of a DataFrame build and a per-tree Python loop.
+    """
+
+    def __init__(self, feature, threshold, children_left, children_right, leaf_proba, roots, max_depth,
+                 classes, feature_names=SENSOR_FEATURES):
+        self.feature = feature
+        self.threshold = threshold
+        self.children_left = children_left
+        self.children_right = children_right
+        # Interleaved (left, right) pairs so one gather picks the next node
+        self.children = np.stack([children_left, children_right], axis=1).ravel()
+        self.leaf_proba = leaf_proba
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes = classes
+        self.feature_names = list(feature_names)
+        # Artifact metadata of a versioned model, see load_sensor_scorer()
+        self.metadata = {}
+        classes = list(classes)
+        # Column of the "fire" class; matches predict_proba(...)[:, 1] for a 0/1 model
+        self.fire_index = classes.index(1) if 1 in classes else 1
+        self.leaf_fire_proba = np.ascontiguousarray(leaf_proba[:, self.fire_index])
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        features, thresholds, lefts, rights, probas, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes)
+            is_leaf = tree.children_left == -1
+
+            # Leaves point back to themselves so every row can take the same number of steps
+            left = np.where(is_leaf, node_ids, tree.children_left) + offset
+            right = np.where(is_leaf, node_ids, tree.children_right) + offset
+            feature = np.where(is_leaf, 0, tree.feature)
+
+            # Same normalization as DecisionTreeClassifier.predict_proba
+            value = tree.value[:, 0, :].astype(np.float64)
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+
+            features.append(feature)
+            thresholds.append(tree.threshold)
+            lefts.append(left)
+            rights.append(right)
+            probas.append(value / normalizer)
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n_nodes
+
+        feature_names = getattr(forest, 'feature_names_in_', SENSOR_FEATURES)
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            children_left=np.concatenate(lefts).astype(np.intp),
+            children_right=np.concatenate(rights).astype(np.intp),
+            leaf_proba=np.concatenate(probas),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            classes=forest.classes_,
+            feature_names=feature_names,
+        )
+
+    def predict_proba(self, X):
+        """
+        Class probabilities for a batch of readings, equal to RandomForestClassifier.predict_proba.
+        :param X: Array-like of shape (n_samples, n_features), columns in `feature_names` order
+        :return: Array of shape (n_samples, n_classes)
+        """
+        return self._leaf_values(X, self.leaf_proba)
+
+    def _leaf_nodes(self, X):
+        # scikit-learn compares float32 features against float64 thresholds; do the same
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        n_samples, n_features = X.shape
+        X_flat = X.astype(np.float64).ravel()
+        row_offsets = (np.arange(n_samples, dtype=np.intp) * n_features)[:, np.newaxis]
+
+        nodes = np.tile(self.roots, (n_samples, 1))
+        for _ in range(self.max_depth):
+            values = np.take(X_flat, row_offsets + np.take(self.feature, nodes))
+            go_right = values > np.take(self.threshold, nodes)
+            nodes = np.take(self.children, 2 * nodes + go_right)
+        return nodes
+
+    def _leaf_values(self, X, leaf_values):
+        # Average of the per-tree leaf values, summed in tree order like RandomForestClassifier
+        return np.take(leaf_values, self._leaf_nodes(X), axis=0).sum(axis=1) / len(self.roots)
+
+    def features_from_readings(self, readings):
+        """
+        Build the feature matrix from sensor reading dictionaries.
+        """
+        return np.array([[reading[name] for name in self.feature_names] for reading in readings], dtype=np.float32)
+
+    def score(self, readings):
+        """
+        Fire confidence percentages (0-100) for a list of sensor reading dictionaries.
+        """
+        X = self.features_from_readings(readings)
+        return self._leaf_values(X, self.leaf_fire_proba) * 100
+
+    def score_one(self, reading):
+        """
+        Fire confidence percentage (0-100) for a single sensor reading dictionary.
+        """
+        return float(self.score([reading])[0])
+
+
+def resolve_sensor_model(model_path=SENSOR_MODEL_PATH, device=SENSOR_MODEL_DEVICE):
+    """
+    Find the model file to load for `model_path`.
+    :return: Tuple of (pickle path, artifact metadata or None for a plain pickle)
+    :raises FileNotFoundError: If the artifact or the requested model does not exist
+    """
+    if not os.path.isdir(model_path):
+        return model_path, None
+    version_dir = model_path
+    latest_path = os.path.join(model_path, 'LATEST')
+    if os.path.exists(latest_path):
+        with open(latest_path) as f:
+            version_dir = os.path.join(model_path, f.read().strip())
+    metadata_path = os.path.join(version_dir, 'metadata.json')
+    if not os.path.exists(metadata_path):
+        raise FileNotFoundError(f"No sensor model metadata in {version_dir}")
+    with open(metadata_path) as f:
+        metadata = json.load(f)
+    if device:
+        models, name = metadata.get("device_models", {}), device
+    else:
+        models, name = metadata["models"], metadata.get("default_model", ALL_DEVICES_MODEL)
+    if name not in models:
+        raise FileNotFoundError(f"Sensor model version {metadata['version']} has no model for '{name}'")
+    return os.path.join(version_dir, models[name]["file"]), dict(metadata, model=name, device=device or None)
+
+
+def load_sensor_scorer(model_path=SENSOR_MODEL_PATH, device=SENSOR_MODEL_DEVICE):
+    """
+    Load the sensor model and compile it for vectorized scoring.
+    :param model_path: A pickled model or a versioned artifact directory, see resolve_sensor_model()
+    :param device: Device whose model to use from a versioned artifact; empty for the model over all devices
+    :return: Tuple of (sklearn_model, CompiledForest)
+    """
+    import joblib
+
+    path, metadata = resolve_sensor_model(model_path, device)
+    sensor_model = joblib.load(path)
+    scorer = CompiledForest.from_sklearn(sensor_model)
+    if metadata:
+        scorer.feature_names = list(metadata["features"])
+        scorer.metadata = {key: metadata[key] for key in ("version", "model", "device", "created_at", "sklearn_version")}
+        print(f"Loaded sensor model '{metadata['model']}' version {metadata['version']}")
+    return sensor_model, scorer
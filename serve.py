@@ -0,0 +1,46 @@
+"""
+Production entry point: serves the Flask app with Waitress instead of the Werkzeug dev server.
+
+Usage:
+    python serve.py
+
+All streams, the model and the alert dispatcher live in this one process, so run a single
+process and size SERVER_THREADS for the expected number of concurrent clients: every open
+/video_feed or /events connection holds one thread for as long as it is open, while those
+threads spend almost all of their time waiting for the next frame or status update.
+"""
+import os
+
+from dotenv import load_dotenv
+from waitress import serve
+
+load_dotenv()
+
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "5000"))
+# Worker threads: concurrent MJPEG viewers + SSE clients + headroom for short requests
+SERVER_THREADS = int(os.getenv("SERVER_THREADS", "64"))
+# Open connections accepted before new ones are refused
+SERVER_CONNECTION_LIMIT = int(os.getenv("SERVER_CONNECTION_LIMIT", "500"))
+
+
+def main():
+    from fire_detection_inference import create_app
+
+    # The server listens right away; /ready reports 503 until the models have loaded in the background
+    app = create_app()
+    print(f"Serving on http://{SERVER_HOST}:{SERVER_PORT} with {SERVER_THREADS} threads")
+    serve(
+        app,
+        host=SERVER_HOST,
+        port=SERVER_PORT,
+        threads=SERVER_THREADS,
+        connection_limit=SERVER_CONNECTION_LIMIT,
+        # Long-lived streams are kept alive by their own keepalives; idle sockets are closed after this
+        channel_timeout=60,
+        ident="fire-detection",
+    )
+
+
+if __name__ == '__main__':
+    main()
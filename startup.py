@@ -0,0 +1,114 @@
+import os
+import time
+from threading import Lock, Thread
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Seconds from the first import of the app until create_app() returns; a slower start is logged as a warning
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "2.0"))
+# Seconds before a subsystem that failed to initialize is tried again
+SUBSYSTEM_RETRY_SECONDS = 30.0
+
+# Set when this module is first imported, which the app does before any heavy import
+STARTED_AT = time.time()
+
+
+class Subsystem:
+    """
+    A heavy dependency that is initialized in a background thread, ahead of time or on first use.
+    Readers never wait for it: get() raises until it is ready, so request handlers and pipeline stages keep running
+    during a cold start. Initialization runs in one thread at a time; a failure is remembered and retried after
+    SUBSYSTEM_RETRY_SECONDS.
+    """
+
+    def __init__(self, name, factory, retry_seconds=SUBSYSTEM_RETRY_SECONDS):
+        """
+        :param factory: Callable returning the initialized value
+        """
+        self.name = name
+        self.factory = factory
+        self.retry_seconds = retry_seconds
+        self.state = 'pending'
+        self.value = None
+        self.error = None
+        self.init_seconds = None
+        self.ready_at = None
+        self._failed_at = None
+        self._lock = Lock()
+
+    @property
+    def ready(self):
+        return self.state == 'ready'
+
+    def _initialize(self):
+        start_time = time.perf_counter()
+        try:
+            self.value = self.factory()
+            self.error = None
+            self.ready_at = time.time()
+            self.state = 'ready'
+        except Exception as e:
+            self.error = str(e)
+            self._failed_at = time.monotonic()
+            self.state = 'failed'
+            print(f"Error initializing {self.name}: {e}")
+        self.init_seconds = time.perf_counter() - start_time
+
+    def get(self):
+        """
+        :return: The initialized value
+        :raises RuntimeError: Without waiting, if it is still loading or failed; initialization is started if due
+        """
+        if self.state != 'ready':
+            self.start()
+            raise RuntimeError(f"{self.name} is not available: {self.error or self.state}")
+        return self.value
+
+    def start(self):
+        """
+        Initialize in a background thread without blocking the caller.
+        Does nothing if it is ready, already loading, or failed less than retry_seconds ago.
+        """
+        with self._lock:
+            retry = self.state == 'failed' and time.monotonic() - self._failed_at >= self.retry_seconds
+            if self.state != 'pending' and not retry:
+                return
+            self.state = 'loading'
+        thread = Thread(target=self._initialize, name=f"init-{self.name}")
+        thread.daemon = True
+        thread.start()
+
+    def status(self):
+        return {
+            "state": self.state,
+            "error": self.error,
+            "init_seconds": self.init_seconds,
+            "ready_after_seconds": self.ready_at - STARTED_AT if self.ready_at else None,
+        }
+
+
+class StartupTimer:
+    """
+    Measures how long the app took to become able to serve requests, against STARTUP_BUDGET_SECONDS.
+    """
+
+    def __init__(self, budget_seconds=STARTUP_BUDGET_SECONDS):
+        self.budget_seconds = budget_seconds
+        self.app_created_seconds = None
+
+    def app_created(self):
+        self.app_created_seconds = time.time() - STARTED_AT
+        if self.app_created_seconds > self.budget_seconds:
+            print(f"Warning: startup took {self.app_created_seconds:.2f}s, over the "
+                  f"{self.budget_seconds:.2f}s budget (STARTUP_BUDGET_SECONDS)")
+        else:
+            print(f"App created in {self.app_created_seconds:.2f}s")
+
+    def stats(self):
+        return {
+            "app_created_seconds": self.app_created_seconds,
+            "budget_seconds": self.budget_seconds,
+            "within_budget": self.app_created_seconds is not None and self.app_created_seconds <= self.budget_seconds,
+        }
@@ -0,0 +1,93 @@
+import json
+import os
+import time
+from threading import Condition
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Maximum status pushes per second to each client; updates in between are coalesced to the latest
+STATUS_PUSH_MAX_RATE = float(os.getenv("STATUS_PUSH_MAX_RATE", "4"))
+# Seconds between keepalive comments on an idle event stream
+STATUS_PUSH_KEEPALIVE = 15.0
+
+# Status fields that change on every frame without carrying new information
+_VOLATILE_FIELDS = ('captured_at', 'updated_at')
+
+
+def _comparable(status):
+    return {key: value for key, value in status.items() if key not in _VOLATILE_FIELDS}
+
+
+class StatusBroadcaster:
+    """
+    Pushes per-stream status changes to Server-Sent Events clients.
+    A status is serialized once when it changes and the same bytes go to every client, so the cost
+    of a status update does not grow with the number of dashboards.
+    """
+
+    def __init__(self):
+        self._condition = Condition()
+        self._version = 0
+        # stream_id -> (version, comparable status, SSE message bytes)
+        self._latest = {}
+        self.subscribers = 0
+
+    def publish(self, stream_id, status):
+        """
+        Record the latest status of a stream; clients are only woken if it changed.
+        """
+        comparable = _comparable(status)
+        with self._condition:
+            previous = self._latest.get(stream_id)
+            if previous is not None and previous[1] == comparable:
+                return False
+            self._version += 1
+            message = f"event: status\nid: {self._version}\ndata: {json.dumps(status)}\n\n".encode()
+            self._latest[stream_id] = (self._version, comparable, message)
+            self._condition.notify_all()
+            return True
+
+    def remove(self, stream_id):
+        with self._condition:
+            self._latest.pop(stream_id, None)
+
+    def subscribe(self, stream_id=None, max_rate=STATUS_PUSH_MAX_RATE):
+        """
+        Generator of SSE messages for one client.
+        :param stream_id: Only push this stream's status; None pushes every stream
+        :param max_rate: Maximum messages per second per stream; intermediate updates are skipped
+        """
+        min_interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        last_version = 0
+        last_sent = time.monotonic()
+        with self._condition:
+            self.subscribers += 1
+        try:
+            while True:
+                started = time.monotonic()
+                with self._condition:
+                    self._condition.wait_for(lambda: self._version > last_version, STATUS_PUSH_KEEPALIVE)
+                    messages = [
+                        message for sid, (version, _, message) in self._latest.items()
+                        if version > last_version and (stream_id is None or sid == stream_id)
+                    ]
+                    last_version = self._version
+
+                if not messages:
+                    if time.monotonic() - last_sent >= STATUS_PUSH_KEEPALIVE:
+                        # Keeps proxies from closing the connection and detects disconnected clients
+                        last_sent = time.monotonic()
+                        yield b": keepalive\n\n"
+                    continue
+                for message in messages:
+                    yield message
+                last_sent = time.monotonic()
+
+                elapsed = time.monotonic() - started
+                if elapsed < min_interval:
+                    time.sleep(min_interval - elapsed)
+        finally:
+            with self._condition:
+                self.subscribers -= 1
@@ -0,0 +1,158 @@
+import time
+from threading import Event, Lock, Thread
+
+from detection_history import DetectionHistory
+from mjpeg_broadcaster import FrameBroadcaster
+
+
+class DetectionState:
+    """
+    Latest detection results of a stream, shared between its pipeline thread and request handlers.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._status = None
+        self._updates = 0
+
+    def update(self, status):
+        """
+        Replace the status; the caller must not modify it afterwards.
+        """
+        with self._lock:
+            self._status = status
+            self._updates += 1
+
+    def snapshot(self):
+        """
+        :return: Copy of the latest status, or None before the first processed frame
+        """
+        with self._lock:
+            return dict(self._status) if self._status is not None else None
+
+    @property
+    def updates(self):
+        with self._lock:
+            return self._updates
+
+
+class VideoStream:
+    """
+    State for a single camera source: its worker thread, latest frame and detection results.
+    """
+
+    def __init__(self, stream_id, input_source, location="Unknown", roi=None):
+        self.stream_id = stream_id
+        self.input_source = input_source
+        self.location = location
+        # Regions of interest (x, y, w, h as fractions of the frame) inferred at full resolution
+        self.roi = list(roi or [])
+        self.thread = None
+        self.pipeline = None
+        self.capture = None
+        self.frame_skipper = None
+        self.motion_gate = None
+        self.tiler = None
+        self.alert_evaluator = None
+        self.stop_event = Event()
+        self.started_at = time.time()
+
+        # Latest results produced by the worker for this stream
+        self.broadcaster = FrameBroadcaster(stream_id=stream_id)
+        self.state = DetectionState()
+        # Recent per-frame results and alert keyframes, for /history
+        self.history = DetectionHistory()
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def stop(self, timeout=None):
+        """
+        Signal the worker to stop and wait for it to exit.
+        """
+        self.stop_event.set()
+        if self.is_running():
+            self.thread.join(timeout)
+        self.broadcaster.close()
+
+    def to_dict(self):
+        return {
+            "stream_id": self.stream_id,
+            "input_source": self.input_source,
+            "location": self.location,
+            "running": self.is_running(),
+            "started_at": self.started_at,
+            "capture": self.capture.stats() if self.capture else None,
+            "frame_skip": self.frame_skipper.skip if self.frame_skipper else None,
+            "motion_gate": self.motion_gate.stats() if self.motion_gate else None,
+            "tiling": self.tiler.stats() if self.tiler else None,
+            "pipeline": self.pipeline.stats() if self.pipeline else None,
+            "mjpeg": self.broadcaster.stats(),
+            "alerts": self.alert_evaluator.stats() if self.alert_evaluator else None,
+            "history": self.history.stats(),
+        }
+
+
+class StreamManager:
+    """
+    Registry of active video streams keyed by stream ID.
+    All streams share the process-wide YOLO model; each one gets its own worker thread.
+    """
+
+    def __init__(self):
+        self._streams = {}
+        self._lock = Lock()
+        # One lock per stream ID, held for the whole replacement so concurrent starts cannot orphan a worker
+        self._start_locks = {}
+
+    def start(self, stream_id, input_source, target, location="Unknown", roi=None):
+        """
+        Start a worker for `input_source` under `stream_id`, replacing any stream with the same ID.
+        :param location: Human-readable location used in alerts
+        :param roi: Regions of interest for full-resolution tiles, see tiling.parse_regions()
+        :param target: Worker function called with the VideoStream as its only argument
+        :return: The new VideoStream
+        """
+        with self._lock:
+            start_lock = self._start_locks.setdefault(stream_id, Lock())
+        with start_lock:
+            with self._lock:
+                previous = self._streams.pop(stream_id, None)
+            # Stopped outside self._lock so other streams stay usable while the old worker exits
+            if previous:
+                previous.stop()
+
+            stream = VideoStream(stream_id, input_source, location, roi)
+            stream.thread = Thread(target=target, args=(stream,), name=f"stream-{stream_id}")
+            stream.thread.daemon = True
+            with self._lock:
+                self._streams[stream_id] = stream
+            stream.thread.start()
+            return stream
+
+    def stop(self, stream_id):
+        """
+        Stop and remove a stream.
+        :return: True if the stream existed
+        """
+        with self._lock:
+            stream = self._streams.pop(stream_id, None)
+        if not stream:
+            return False
+        stream.stop()
+        return True
+
+    def stop_all(self):
+        with self._lock:
+            streams = list(self._streams.values())
+            self._streams.clear()
+        for stream in streams:
+            stream.stop()
+
+    def get(self, stream_id):
+        with self._lock:
+            return self._streams.get(stream_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._streams.values())
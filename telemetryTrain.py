@@ -1,40 +1,296 @@
-import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import classification_report
-import joblib
-from os import system
-
-
-# Step 1: Load the dataset
-data = pd.read_csv('datasets/iot_telemetry_data.csv')  # Replace with the actual path to your dataset
-
-# Step 2: Filter data for the specific device
-device_data = data[data['device'] == 'b8:27:eb:bf:9d:51']
-
-# Step 3: Create synthetic labels
-device_data['fire'] = (
-    (device_data['co'] > 0.02) |
-    (device_data['humidity'] < 30) |
-    (device_data['lpg'] > 0.01) |
-    (device_data['smoke'] > 0.03) |
-    (device_data['temp'] > 100)
-).astype(int)
-
-# Step 4: Select features and labels
-X = device_data[['co', 'humidity', 'lpg', 'smoke', 'temp']]
-y = device_data['fire']
-
-# Step 5: Split the data into training and testing sets
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-# Step 6: Train a Random Forest Classifier
-model = RandomForestClassifier(random_state=42)
-model.fit(X_train, y_train)
-
-# Step 7: Evaluate the model
-y_pred = model.predict(X_test)
-print(classification_report(y_test, y_pred))
-
-# Step 8: Save the trained model
-joblib.dump(model, 'models/sensor_fire_model.pkl')
\ No newline at end of file
+"""
+Train the sensor fire model from the IoT telemetry CSV.
+
+The CSV is read once in chunks and split into one memory-mapped float32 array per device under
+datasets/telemetry_cache/, so later runs skip the parse and peak memory does not grow with the file.
+A model over all devices and one model per device are then trained in parallel worker processes, each on at
+most --max-rows rows sampled from the arrays. The result is written as a versioned artifact:
+
+    models/sensor/<version>/metadata.json   # features, label rule, source file, per-model rows and scores
+    models/sensor/<version>/all.pkl         # model over all devices
+    models/sensor/<version>/devices/<device>.pkl
+    models/sensor/LATEST                    # name of the newest version
+
+Point SENSOR_MODEL_PATH at models/sensor (or at one version directory) to serve it.
+
+Usage:
+    python telemetryTrain.py [--csv datasets/iot_telemetry_data.csv] [--devices b8:27:eb:bf:9d:51 ...]
+                             [--no-per-device] [--max-rows 500000] [--workers N]
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from sensor_scoring import ALL_DEVICES_MODEL, SENSOR_FEATURES, SENSOR_MODELS_DIR
+
+TELEMETRY_CSV_PATH = 'datasets/iot_telemetry_data.csv'
+# Per-device memory-mapped arrays converted from the CSV
+TELEMETRY_CACHE_DIR = 'datasets/telemetry_cache'
+# Rows parsed per CSV chunk; bounds the memory used by the conversion
+CSV_CHUNK_ROWS = 200_000
+# Rows sampled per model; bounds the memory used by each training worker
+MAX_TRAINING_ROWS = 500_000
+# Synthetic labels: a reading counts as fire when any of these holds
+LABEL_RULES = [('co', '>', 0.02), ('humidity', '<', 30), ('lpg', '>', 0.01), ('smoke', '>', 0.03), ('temp', '>', 100)]
+
+
+def source_signature(csv_path):
+    stat = os.stat(csv_path)
+    return {"path": os.path.abspath(csv_path), "bytes": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def device_file_name(device):
+    return re.sub(r'[^0-9A-Za-z]+', '-', device).strip('-') or 'device'
+
+
+def convert_csv(csv_path=TELEMETRY_CSV_PATH, cache_dir=TELEMETRY_CACHE_DIR, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Split the CSV into one raw float32 file per device, reading CSV_CHUNK_ROWS rows at a time.
+    The conversion is skipped when the cache was built from the same file (same size and modification time).
+    :return: The cache index: {"source": ..., "features": [...], "devices": {device: {"file", "rows"}}}
+    """
+    import pandas as pd
+
+    signature = source_signature(csv_path)
+    index_path = os.path.join(cache_dir, 'index.json')
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+        if index.get("source") == signature and index.get("features") == SENSOR_FEATURES:
+            print(f"Using converted telemetry in {cache_dir}")
+            return index
+
+    print(f"Converting {csv_path} to per-device arrays in {cache_dir}...")
+    start_time = time.perf_counter()
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.makedirs(cache_dir)
+    files, devices = {}, {}
+    try:
+        chunks = pd.read_csv(csv_path, usecols=['device'] + SENSOR_FEATURES, chunksize=chunk_rows,
+                             dtype={name: np.float32 for name in SENSOR_FEATURES})
+        for chunk in chunks:
+            chunk = chunk.dropna()
+            for device, rows in chunk.groupby('device', sort=False):
+                if device not in files:
+                    # Devices whose IDs map to the same file name get a numbered suffix; the index keeps the names
+                    taken = {entry["file"] for entry in devices.values()}
+                    name, suffix = device_file_name(device), 1
+                    while name + '.f32' in taken:
+                        name, suffix = f"{device_file_name(device)}-{suffix}", suffix + 1
+                    devices[device] = {"file": name + '.f32', "rows": 0}
+                    files[device] = open(os.path.join(cache_dir, devices[device]["file"]), 'wb')
+                files[device].write(rows[SENSOR_FEATURES].to_numpy(dtype=np.float32).tobytes())
+                devices[device]["rows"] += len(rows)
+    finally:
+        for f in files.values():
+            f.close()
+
+    # Written last, so an interrupted conversion is redone on the next run
+    index = {"source": signature, "features": SENSOR_FEATURES, "devices": devices}
+    with open(index_path, 'w') as f:
+        json.dump(index, f, indent=2)
+    total = sum(entry["rows"] for entry in devices.values())
+    print(f"Converted {total} rows from {len(devices)} devices in {time.perf_counter() - start_time:.1f}s")
+    return index
+
+
+def open_device(cache_dir, entry):
+    """
+    Memory-map one device's readings as a (rows, features) float32 array without reading it.
+    """
+    return np.memmap(os.path.join(cache_dir, entry["file"]), dtype=np.float32, mode='r',
+                     shape=(entry["rows"], len(SENSOR_FEATURES)))
+
+
+def sample_rows(data, max_rows, rng):
+    """
+    Copy at most `max_rows` rows of a memory-mapped array into memory, sampled uniformly in file order.
+    """
+    if len(data) <= max_rows:
+        return np.array(data)
+    return data[np.sort(rng.choice(len(data), size=max_rows, replace=False))]
+
+
+def label(X):
+    """
+    Synthetic fire labels from LABEL_RULES for a (rows, features) array.
+    """
+    fire = np.zeros(len(X), dtype=bool)
+    for name, op, value in LABEL_RULES:
+        column = X[:, SENSOR_FEATURES.index(name)]
+        fire |= column > value if op == '>' else column < value
+    return fire.astype(np.int8)
+
+
+def train_model(task):
+    """
+    Train and save one model in a worker process.
+    :param task: Dict with the model name, the devices to sample from and the training settings
+    :return: Summary for the artifact metadata, or None if the sample has a single class
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import classification_report
+    from sklearn.model_selection import train_test_split
+    import joblib
+
+    start_time = time.perf_counter()
+    rng = np.random.default_rng(task["seed"])
+    index = task["index"]
+    total = sum(index["devices"][device]["rows"] for device in task["devices"])
+    # Step 1: Sample and label the readings; each device contributes in proportion to its rows
+    X = np.concatenate([
+        sample_rows(open_device(task["cache_dir"], index["devices"][device]),
+                    max(1, task["max_rows"] * index["devices"][device]["rows"] // max(total, 1)), rng)
+        for device in task["devices"]
+    ])
+    y = label(X)
+    if len(np.unique(y)) < 2:
+        print(f"Skipping model '{task['name']}': all {len(y)} sampled readings have the same label")
+        return None
+
+    # Step 2: Split the data into training and testing sets
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=task["test_size"], random_state=42)
+
+    # Step 3: Train a Random Forest Classifier
+    model = RandomForestClassifier(random_state=42, n_jobs=task["n_jobs"])
+    model.fit(X_train, y_train)
+
+    # Step 4: Evaluate the model
+    y_pred = model.predict(X_test)
+    print(f"Model '{task['name']}':\n{classification_report(y_test, y_pred, zero_division=0)}")
+
+    # Step 5: Save the trained model
+    model.n_jobs = None
+    joblib.dump(model, os.path.join(task["output_dir"], task["file"]))
+    return {
+        "name": task["name"],
+        "device": task["device"],
+        "file": task["file"],
+        "devices": task["devices"],
+        "source_rows": total,
+        "train_rows": len(X_train),
+        "test_rows": len(X_test),
+        "fire_rate": float(y.mean()),
+        "report": classification_report(y_test, y_pred, output_dict=True, zero_division=0),
+        "train_seconds": time.perf_counter() - start_time,
+    }
+
+
+def create_version_dir(models_dir):
+    """
+    Create a new, empty version directory named after the current time.
+    A run that starts in the same second as another gets a numbered suffix instead of sharing its directory.
+    :return: Tuple of (version, directory)
+    """
+    os.makedirs(models_dir, exist_ok=True)
+    base = version = time.strftime('%Y%m%d-%H%M%S')
+    suffix = 1
+    while True:
+        output_dir = os.path.join(models_dir, version)
+        try:
+            # mkdir fails if the directory exists, so two runs can never both claim it
+            os.mkdir(output_dir)
+            return version, output_dir
+        except FileExistsError:
+            version = f"{base}-{suffix}"
+            suffix += 1
+
+
+def write_latest(models_dir, version):
+    temp_path = os.path.join(models_dir, 'LATEST.tmp')
+    with open(temp_path, 'w') as f:
+        f.write(version + '\n')
+    os.replace(temp_path, os.path.join(models_dir, 'LATEST'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the sensor fire model from the IoT telemetry CSV")
+    parser.add_argument('--csv', default=TELEMETRY_CSV_PATH)
+    parser.add_argument('--cache-dir', default=TELEMETRY_CACHE_DIR)
+    parser.add_argument('--models-dir', default=SENSOR_MODELS_DIR)
+    parser.add_argument('--devices', nargs='*', help="Devices to train on (default: all devices in the CSV)")
+    parser.add_argument('--no-per-device', action='store_true', help="Only train the model over all devices")
+    parser.add_argument('--chunk-rows', type=int, default=CSV_CHUNK_ROWS)
+    parser.add_argument('--max-rows', type=int, default=MAX_TRAINING_ROWS, help="Rows sampled per model")
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--no-latest', action='store_true', help="Do not point models/sensor/LATEST at this version")
+    args = parser.parse_args()
+
+    # Step 1: Convert the dataset once to per-device arrays
+    index = convert_csv(args.csv, args.cache_dir, args.chunk_rows)
+
+    # Step 2: Select the devices
+    devices = args.devices or sorted(index["devices"])
+    unknown = [device for device in devices if device not in index["devices"]]
+    if unknown:
+        parser.error(f"Unknown devices: {', '.join(unknown)}")
+    if not sum(index["devices"][device]["rows"] for device in devices):
+        raise SystemExit(f"No complete sensor readings in {args.csv} for the selected devices; nothing to train")
+
+    # Step 3: Plan one model over all selected devices, and one per device
+    version, output_dir = create_version_dir(args.models_dir)
+    os.mkdir(os.path.join(output_dir, 'devices'))
+    # Per-device models live apart from the model over all devices, so a device named like it cannot clash,
+    # and reuse the file names convert_csv() already made unique
+    plans = [(None, 'all.pkl', devices)]
+    if not args.no_per_device and len(devices) > 1:
+        plans += [(device, os.path.join('devices', os.path.splitext(index["devices"][device]["file"])[0] + '.pkl'),
+                   [device]) for device in devices]
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(args.workers, len(plans)))
+    # Cores left over when there are fewer models than workers go to the trees of each forest
+    n_jobs = max(1, cpus // workers)
+
+    # Step 4: Train the models in parallel, largest first
+    tasks = [{
+        "name": ALL_DEVICES_MODEL if device is None else device,
+        "device": device,
+        "file": file,
+        "devices": model_devices,
+        "index": index,
+        "cache_dir": args.cache_dir,
+        "output_dir": output_dir,
+        "max_rows": args.max_rows,
+        "test_size": args.test_size,
+        "n_jobs": n_jobs,
+        "seed": seed,
+    } for seed, (device, file, model_devices) in enumerate(plans)]
+    tasks.sort(key=lambda task: -sum(index["devices"][device]["rows"] for device in task["devices"]))
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = [result for result in executor.map(train_model, tasks) if result is not None]
+    if not any(result["device"] is None for result in results):
+        shutil.rmtree(output_dir)
+        raise SystemExit("The model over all devices could not be trained; no artifact written")
+
+    # Step 5: Write the metadata the inference server loads the artifact with
+    import sklearn
+
+    metadata = {
+        "version": version,
+        "created_at": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        "features": SENSOR_FEATURES,
+        "label_rules": [f"{name} {op} {value}" for name, op, value in LABEL_RULES],
+        "source": index["source"],
+        "sklearn_version": sklearn.__version__,
+        "default_model": ALL_DEVICES_MODEL,
+        "models": {result["name"]: result for result in results if result["device"] is None},
+        "device_models": {result["device"]: result for result in results if result["device"] is not None},
+    }
+    with open(os.path.join(output_dir, 'metadata.json'), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    if not args.no_latest:
+        write_latest(args.models_dir, version)
+    print(f"Trained {len(results)} models with {workers} workers in {time.perf_counter() - start_time:.1f}s; "
+          f"saved version {version} to {output_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+
+from detections import Detections, merge_detections
+
+load_dotenv()
+
+# Also tile around whatever the low-resolution pass finds, not only the configured regions
+TILE_ADAPTIVE = os.getenv("TILE_ADAPTIVE", "false").lower() in ("1", "true", "yes")
+# Side of the square full-resolution tiles, in source pixels
+TILE_SIZE = int(os.getenv("TILE_SIZE", "640"))
+# Upper bound on tiles per frame, to cap the cost on busy scenes
+TILE_MAX_PER_FRAME = int(os.getenv("TILE_MAX_PER_FRAME", "4"))
+# Boxes of the same label overlapping more than this are merged
+TILE_NMS_IOU = float(os.getenv("TILE_NMS_IOU", "0.5"))
+# Overlap between neighboring tiles covering a large region, so objects on a seam are seen whole once
+TILE_OVERLAP = 0.15
+
+
+def parse_regions(text):
+    """
+    Parse regions of interest given as "x,y,w,h;x,y,w,h" in fractions of the frame size (0-1).
+    :return: List of (x, y, w, h) tuples
+    :raises ValueError: If a region is malformed or outside the frame
+    """
+    regions = []
+    for part in (text or '').split(';'):
+        if not part.strip():
+            continue
+        values = [float(value) for value in part.split(',')]
+        if len(values) != 4:
+            raise ValueError(f"Region '{part}' must have 4 values: x,y,w,h")
+        x, y, w, h = values
+        if w <= 0 or h <= 0 or x < 0 or y < 0 or x + w > 1.0001 or y + h > 1.0001:
+            raise ValueError(f"Region '{part}' must lie within 0-1 with positive width and height")
+        regions.append((x, y, w, h))
+    return regions
+
+
+def _axis_windows(start, end, tile, limit):
+    """
+    Start offsets of tiles of length `tile` covering [start, end) within [0, limit).
+    """
+    tile = min(tile, limit)
+    length = end - start
+    if length <= tile:
+        center = (start + end) / 2
+        return [int(min(max(center - tile / 2, 0), limit - tile))]
+    step = tile * (1 - TILE_OVERLAP)
+    count = int(np.ceil((length - tile) / step)) + 1
+    return [int(min(start + round(index * (length - tile) / (count - 1)), limit - tile)) for index in range(count)]
+
+
+def _covered(window, windows):
+    return any(w[0] <= window[0] and w[1] <= window[1] and w[2] >= window[2] and w[3] >= window[3] for w in windows)
+
+
+def tile_windows(frame_shape, areas, tile_size=TILE_SIZE, max_tiles=TILE_MAX_PER_FRAME):
+    """
+    Square full-resolution windows covering each area; an area larger than a tile is covered by overlapping tiles.
+    :param areas: List of (x1, y1, x2, y2) in source pixels, most important first
+    :return: List of (x1, y1, x2, y2) windows, at most `max_tiles`
+    """
+    height, width = frame_shape[:2]
+    windows = []
+    for x1, y1, x2, y2 in areas:
+        for top in _axis_windows(max(0, y1), min(height, y2), tile_size, height):
+            for left in _axis_windows(max(0, x1), min(width, x2), tile_size, width):
+                window = (left, top, left + min(tile_size, width), top + min(tile_size, height))
+                # A window inside one already chosen adds nothing
+                if _covered(window, windows):
+                    continue
+                windows.append(window)
+                if len(windows) >= max_tiles:
+                    return windows
+    return windows
+
+
+class TiledDetector:
+    """
+    Recovers small, distant fire and smoke that the low-resolution pass misses on high-resolution cameras.
+    Full-resolution tiles over the configured regions of interest are submitted together with the
+    low-resolution frame, so both run in one predict call. In adaptive mode a second batch of tiles is cut
+    around the boxes the low-resolution pass found. All boxes are merged by non-maximum suppression.
+    """
+
+    def __init__(self, detect_many, regions=None, adaptive=TILE_ADAPTIVE, tile_size=TILE_SIZE,
+                 max_tiles=TILE_MAX_PER_FRAME, iou_threshold=TILE_NMS_IOU):
+        """
+        :param detect_many: Callable(frames, stream_id) returning one Detections per frame
+        :param regions: Regions of interest as returned by parse_regions()
+        """
+        self.detect_many = detect_many
+        self.regions = list(regions or [])
+        self.adaptive = adaptive
+        self.tile_size = tile_size
+        self.max_tiles = max(1, max_tiles)
+        self.iou_threshold = iou_threshold
+        self.frames = 0
+        self.tiles = 0
+
+    @property
+    def active(self):
+        return bool(self.regions) or self.adaptive
+
+    def _to_processed(self, windows, results, scale):
+        # Tile pixels -> source pixels -> processed-frame pixels
+        tiles = []
+        for (x1, y1, _, _), detections in zip(windows, results):
+            boxes = (detections.boxes + [x1, y1, x1, y1]) / scale
+            tiles.append(Detections(boxes.astype(np.float32), detections.confidences, detections.labels))
+        return tiles
+
+    def detect(self, frame, source, stream_id):
+        """
+        :param frame: The resized frame used for the low-resolution pass and for display
+        :param source: The same frame at full resolution
+        :return: Merged Detections in `frame` coordinates
+        """
+        height, width = source.shape[:2]
+        scale = np.array([width / frame.shape[1], height / frame.shape[0]] * 2, dtype=np.float32)
+
+        areas = [(int(x * width), int(y * height), int((x + w) * width), int((y + h) * height))
+                 for x, y, w, h in self.regions]
+        windows = tile_windows(source.shape, areas, self.tile_size, self.max_tiles)
+        results = self.detect_many([frame] + [source[y1:y2, x1:x2] for x1, y1, x2, y2 in windows], stream_id)
+        coarse = results[0]
+        parts = [coarse] + self._to_processed(windows, results[1:], scale)
+
+        if self.adaptive and len(coarse.boxes) and len(windows) < self.max_tiles:
+            # Look closer around what the coarse pass found, skipping areas the region tiles already cover
+            areas = [tuple(box) for box in (coarse.boxes * scale).astype(int)]
+            adaptive = [window for window in tile_windows(source.shape, areas, self.tile_size, self.max_tiles)
+                        if not _covered(window, windows)][:self.max_tiles - len(windows)]
+            if adaptive:
+                results = self.detect_many([source[y1:y2, x1:x2] for x1, y1, x2, y2 in adaptive], stream_id)
+                parts += self._to_processed(adaptive, results, scale)
+                windows = windows + adaptive
+
+        self.frames += 1
+        self.tiles += len(windows)
+        return merge_detections(parts, self.iou_threshold)
+
+    def stats(self):
+        return {
+            "regions": self.regions,
+            "adaptive": self.adaptive,
+            "tile_size": self.tile_size,
+            "frames": self.frames,
+            "tiles": self.tiles,
+            "tiles_per_frame": self.tiles / self.frames if self.frames else 0.0,
+        }
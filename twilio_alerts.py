@@ -1,8 +1,12 @@
 import os
 import time
-from twilio.rest import Client
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from threading import Lock, Thread
 from dotenv import load_dotenv
 
+from metrics import ALERT_SEND_ERRORS, ALERT_SEND_SECONDS, metrics
+
 # Load environment variables
 load_dotenv()
 
@@ -23,102 +27,233 @@ ADJUSTED_CONFIDENCE_THRESHOLD = float(os.getenv("ADJUSTED_CONFIDENCE_THRESHOLD",
 WHATSAPP_COOLDOWN = int(os.getenv("WHATSAPP_COOLDOWN", "300"))  # 5 minutes
 SMS_COOLDOWN = int(os.getenv("SMS_COOLDOWN", "600"))  # 10 minutes
 
-# Store last sent timestamps
-last_whatsapp_alert = 0
-last_sms_alert = 0
+# Background dispatcher settings
+ALERT_WORKERS = int(os.getenv("ALERT_WORKERS", "4"))  # Concurrent Twilio requests
+ALERT_MAX_RETRIES = int(os.getenv("ALERT_MAX_RETRIES", "3"))
+ALERT_RETRY_BACKOFF = float(os.getenv("ALERT_RETRY_BACKOFF", "1.0"))  # Seconds, doubled after every attempt
+# Use the in-process fake client instead of Twilio (local testing)
+TWILIO_FAKE_CLIENT = os.getenv("TWILIO_FAKE_CLIENT", "false").lower() in ("1", "true", "yes")
 
-# Initialize Twilio client
-client = None
-if TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN:
-    client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-else:
-    print("Warning: Twilio credentials not set. Alerts will not be sent.")
 
-def send_whatsapp_alert(message):
+class FakeTwilioClient:
     """
-    Send WhatsApp alert to configured recipients
+    Local stand-in for twilio.rest.Client that records messages instead of sending them.
+    :param delay: Seconds each create() call takes, to mimic a slow API
+    :param failures: Number of initial create() calls that raise, to exercise retries
     """
-    global last_whatsapp_alert
-    
-    if not client or not TWILIO_WHATSAPP_NUMBER:
-        print("Cannot send WhatsApp alert: Twilio not configured")
-        return False
-    
-    current_time = time.time()
-    if current_time - last_whatsapp_alert < WHATSAPP_COOLDOWN:
-        print(f"WhatsApp alert cooldown in effect. Skipping alert.")
-        return False
-    
-    success = True
-    for recipient in WHATSAPP_RECIPIENTS:
-        if not recipient:
-            continue
-            
-        try:
-            client.messages.create(
-                body=message,
-                from_=f"whatsapp:{TWILIO_WHATSAPP_NUMBER}",
-                to=f"whatsapp:{recipient.strip()}"
-            )
-            print(f"WhatsApp alert sent to {recipient}")
-        except Exception as e:
-            print(f"Failed to send WhatsApp alert to {recipient}: {e}")
-            success = False
-    
-    if success:
-        last_whatsapp_alert = current_time
-    
-    return success
-
-def send_emergency_sms(message):
+
+    def __init__(self, delay=0.0, failures=0):
+        self.messages = self
+        self.sent = []
+        self.delay = delay
+        self.failures = failures
+        self._lock = Lock()
+
+    def create(self, body, from_, to):
+        time.sleep(self.delay)
+        with self._lock:
+            if self.failures > 0:
+                self.failures -= 1
+                raise ConnectionError("Simulated Twilio failure")
+            self.sent.append({"body": body, "from_": from_, "to": to, "sent_at": time.time()})
+
+
+def create_client():
     """
-    Send emergency SMS alert to the emergency contact
+    Build the Twilio client (or the fake one). twilio is only imported here, so importing this module stays cheap.
+    :return: Client, or None if Twilio credentials are not set
     """
-    global last_sms_alert
-    
-    if not client or not TWILIO_PHONE_NUMBER or not EMERGENCY_CONTACT:
-        print("Cannot send SMS alert: Twilio not fully configured")
-        return False
-    
-    current_time = time.time()
-    if current_time - last_sms_alert < SMS_COOLDOWN:
-        print(f"SMS alert cooldown in effect. Skipping alert.")
-        return False
-    
-    try:
-        client.messages.create(
-            body=message,
-            from_=TWILIO_PHONE_NUMBER,
-            to=EMERGENCY_CONTACT
-        )
-        last_sms_alert = current_time
-        print(f"Emergency SMS sent to {EMERGENCY_CONTACT}")
+    if TWILIO_FAKE_CLIENT:
+        return FakeTwilioClient()
+    if TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN:
+        from twilio.rest import Client
+        return Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+    print("Warning: Twilio credentials not set. Alerts will not be sent.")
+    return None
+
+
+def _is_retryable(error):
+    # Twilio rejects bad numbers and bad requests with 4xx; retrying those cannot succeed
+    status = getattr(error, "status", None)
+    return not (isinstance(status, int) and 400 <= status < 500 and status != 429)
+
+
+class AlertDispatcher:
+    """
+    Sends alerts from a background queue so callers never wait on Twilio.
+    Each alert fans out to its recipients through a worker pool, failed sends are retried with
+    exponential backoff, and cooldowns are tracked per channel, alert kind and location. While an alert
+    of a kind is queued or being sent for a location, further alerts of that kind there are dropped as
+    duplicates; alerts of other kinds (e.g. a sensor alert during a camera alert) still go out.
+    """
+
+    def __init__(self, client=None, workers=ALERT_WORKERS, max_retries=ALERT_MAX_RETRIES,
+                 retry_backoff=ALERT_RETRY_BACKOFF, client_factory=None):
+        """
+        :param client_factory: Called once to build the client when `client` is None and it is first needed
+        """
+        self._client = client
+        self._client_factory = client_factory
+        self._client_lock = Lock()
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.cooldowns = {'whatsapp': WHATSAPP_COOLDOWN, 'sms': SMS_COOLDOWN}
+        self._queue = Queue()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="alert-sender")
+        self._lock = Lock()
+        self._last_sent = {}
+        self._in_flight = set()
+        self._thread = None
+        self.stats = {
+            "queued": 0, "sent": 0, "failed": 0, "retries": 0,
+            "duplicates": 0, "cooldown_skipped": 0,
+        }
+
+    @property
+    def client(self):
+        if self._client is None and self._client_factory is not None:
+            with self._client_lock:
+                if self._client_factory is not None:
+                    self._client = self._client_factory()
+                    self._client_factory = None
+        return self._client
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name="alert-dispatcher")
+                self._thread.daemon = True
+                self._thread.start()
+
+    def submit(self, channel, message, location="Unknown", event_time=None, kind=None):
+        """
+        Queue an alert without blocking.
+        :param channel: 'whatsapp' or 'sms'
+        :param event_time: time.time() of the detection that raised the alert, for latency tracking
+        :param kind: What raised the alert (e.g. 'camera', 'sensor'); deduplication and cooldowns are per kind
+        :return: True if the alert was queued, False if skipped by cooldown or deduplication
+        """
+        key = (channel, kind, location)
+        with self._lock:
+            if key in self._in_flight:
+                self.stats["duplicates"] += 1
+                return False
+            if time.time() - self._last_sent.get(key, 0) < self.cooldowns[channel]:
+                self.stats["cooldown_skipped"] += 1
+                print(f"{channel} {kind or ''} alert cooldown in effect for {location}. Skipping alert.")
+                return False
+            self._in_flight.add(key)
+            self.stats["queued"] += 1
+        self._ensure_started()
+        self._queue.put((key, message, event_time or time.time()))
         return True
-    except Exception as e:
-        print(f"Failed to send emergency SMS: {e}")
+
+    def _recipients(self, channel):
+        if channel == 'whatsapp':
+            if not TWILIO_WHATSAPP_NUMBER:
+                return None, []
+            recipients = [r.strip() for r in WHATSAPP_RECIPIENTS if r.strip()]
+            return f"whatsapp:{TWILIO_WHATSAPP_NUMBER}", [f"whatsapp:{r}" for r in recipients]
+        if not TWILIO_PHONE_NUMBER or not EMERGENCY_CONTACT:
+            return None, []
+        return TWILIO_PHONE_NUMBER, [EMERGENCY_CONTACT]
+
+    def _run(self):
+        while True:
+            key, message, event_time = self._queue.get()
+            channel = key[0]
+            try:
+                sender, recipients = self._recipients(channel)
+                if not self.client or not sender or not recipients:
+                    print(f"Cannot send {channel} alert: Twilio not fully configured")
+                    with self._lock:
+                        self._in_flight.discard(key)
+                    continue
+
+                self._deliver(key, message, sender, recipients, event_time)
+            except Exception as e:
+                # Keep the dispatcher alive, and let later alerts for this key through
+                print(f"Error dispatching {channel} alert: {e}")
+                with self._lock:
+                    self.stats["failed"] += 1
+                    self._in_flight.discard(key)
+
+    def _deliver(self, key, message, sender, recipients, event_time):
+        # Fan out to the worker pool; the last send to finish updates the cooldown
+        remaining = [len(recipients)]
+        succeeded = [True]
+
+        def on_done(future):
+            ok = future.exception() is None and future.result()
+            with self._lock:
+                succeeded[0] = succeeded[0] and ok
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    self._in_flight.discard(key)
+                    if succeeded[0]:
+                        self._last_sent[key] = time.time()
+                        self.stats["last_latency_seconds"] = time.time() - event_time
+
+        for recipient in recipients:
+            future = self._pool.submit(self._send_with_retry, key[0], message, sender, recipient)
+            future.add_done_callback(on_done)
+
+    def _send_with_retry(self, channel, message, sender, recipient):
+        for attempt in range(self.max_retries + 1):
+            start_time = time.perf_counter()
+            try:
+                self.client.messages.create(body=message, from_=sender, to=recipient)
+                metrics.observe(ALERT_SEND_SECONDS, time.perf_counter() - start_time, channel=channel)
+                with self._lock:
+                    self.stats["sent"] += 1
+                print(f"Alert sent to {recipient}")
+                return True
+            except Exception as e:
+                metrics.observe(ALERT_SEND_SECONDS, time.perf_counter() - start_time, channel=channel)
+                metrics.inc(ALERT_SEND_ERRORS, channel=channel)
+                if attempt == self.max_retries or not _is_retryable(e):
+                    with self._lock:
+                        self.stats["failed"] += 1
+                    print(f"Failed to send alert to {recipient}: {e}")
+                    return False
+                with self._lock:
+                    self.stats["retries"] += 1
+                time.sleep(self.retry_backoff * (2 ** attempt))
         return False
 
-def check_thresholds_and_alert(fire_confidence, sensor_confidence, adjusted_confidence, location="Unknown"):
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, queue_depth=self._queue.qsize(), in_flight=len(self._in_flight))
+
+
+# The Twilio client is created on first use (or by the app's background startup), not at import
+dispatcher = AlertDispatcher(client_factory=create_client)
+
+
+def send_whatsapp_alert(message, location="Unknown", event_time=None, kind=None):
     """
-    Check if confidence values exceed thresholds and send appropriate alerts
+    Queue a WhatsApp alert to the configured recipients
     """
-    alerts_sent = {
-        'whatsapp': False,
-        'sms': False
-    }
-    
-    # Check for WhatsApp alerts (soft alerts)
-    if fire_confidence >= FIRE_CONFIDENCE_THRESHOLD:
-        message = f"⚠️ WARNING: Camera detected High Fire confedence ({fire_confidence:.1f}%) at {location}. Please check the system."
-        alerts_sent['whatsapp'] = send_whatsapp_alert(message)
-    
-    if sensor_confidence >= SENSOR_CONFIDENCE_THRESHOLD:
-        message = f"⚠️ WARNING: Abnormal sensor readings detected ({sensor_confidence:.1f}%) at {location}. Please check the environment."
-        alerts_sent['whatsapp'] = send_whatsapp_alert(message) or alerts_sent['whatsapp']
-    
-    # Check for emergency SMS alerts
-    if adjusted_confidence >= ADJUSTED_CONFIDENCE_THRESHOLD:
-        message = f"🔥 EMERGENCY ALERT: Fire detected with high confidence ({adjusted_confidence:.1f}%) at {location}. Immediate action required!"
-        alerts_sent['sms'] = send_emergency_sms(message)
-    
-    return alerts_sent
+    return dispatcher.submit('whatsapp', message, location, event_time, kind)
+
+
+def send_emergency_sms(message, location="Unknown", event_time=None, kind=None):
+    """
+    Queue an emergency SMS alert to the emergency contact
+    """
+    return dispatcher.submit('sms', message, location, event_time, kind)
+
+
+def send_camera_alert(fire_confidence, location="Unknown", event_time=None):
+    message = f"⚠️ WARNING: Camera detected High Fire confedence ({fire_confidence:.1f}%) at {location}. Please check the system."
+    return send_whatsapp_alert(message, location, event_time, 'camera')
+
+
+def send_sensor_alert(sensor_confidence, location="Unknown", event_time=None):
+    message = f"⚠️ WARNING: Abnormal sensor readings detected ({sensor_confidence:.1f}%) at {location}. Please check the environment."
+    return send_whatsapp_alert(message, location, event_time, 'sensor')
+
+
+def send_fire_emergency_alert(adjusted_confidence, location="Unknown", event_time=None):
+    message = f"🔥 EMERGENCY ALERT: Fire detected with high confidence ({adjusted_confidence:.1f}%) at {location}. Immediate action required!"
+    return send_emergency_sms(message, location, event_time, 'fire')
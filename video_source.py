@@ -0,0 +1,239 @@
+import os
+import time
+from threading import Event, Lock
+
+import cv2
+from dotenv import load_dotenv
+
+from metrics import CAPTURE_SKIPPED_FRAMES, STAGE_SECONDS, metrics
+
+load_dotenv()
+
+# OpenCV capture backend: auto, ffmpeg, gstreamer, v4l2, msmf, dshow or avfoundation
+CAPTURE_BACKEND = os.getenv("CAPTURE_BACKEND", "auto").lower()
+# Hardware-accelerated decoding: any (use it when available), none, d3d11, vaapi or mfx
+CAPTURE_HW_ACCELERATION = os.getenv("CAPTURE_HW_ACCELERATION", "any").lower()
+# Frames buffered by the backend; 1 keeps only the newest frame, so capture never falls behind a live camera
+CAPTURE_BUFFER_SIZE = int(os.getenv("CAPTURE_BUFFER_SIZE", "1"))
+# Seconds to wait for a source to open, and for a frame from an open source before it counts as lost
+CAPTURE_OPEN_TIMEOUT = float(os.getenv("CAPTURE_OPEN_TIMEOUT", "10"))
+CAPTURE_READ_TIMEOUT = float(os.getenv("CAPTURE_READ_TIMEOUT", "5"))
+# Delay before reconnecting to a lost live source; doubles after each failed attempt up to the maximum
+CAPTURE_RECONNECT_MIN = float(os.getenv("CAPTURE_RECONNECT_MIN", "0.5"))
+CAPTURE_RECONNECT_MAX = float(os.getenv("CAPTURE_RECONNECT_MAX", "30"))
+# Give up on a live source after this many failed reconnects in a row (0 = keep trying)
+CAPTURE_MAX_RECONNECTS = int(os.getenv("CAPTURE_MAX_RECONNECTS", "0"))
+
+_BACKENDS = {
+    'auto': cv2.CAP_ANY,
+    'ffmpeg': cv2.CAP_FFMPEG,
+    'gstreamer': cv2.CAP_GSTREAMER,
+    'v4l2': cv2.CAP_V4L2,
+    'msmf': cv2.CAP_MSMF,
+    'dshow': cv2.CAP_DSHOW,
+    'avfoundation': cv2.CAP_AVFOUNDATION,
+}
+
+_HW_ACCELERATION = {
+    'any': getattr(cv2, 'VIDEO_ACCELERATION_ANY', None),
+    'none': getattr(cv2, 'VIDEO_ACCELERATION_NONE', None),
+    'd3d11': getattr(cv2, 'VIDEO_ACCELERATION_D3D11', None),
+    'vaapi': getattr(cv2, 'VIDEO_ACCELERATION_VAAPI', None),
+    'mfx': getattr(cv2, 'VIDEO_ACCELERATION_MFX', None),
+}
+
+
+def parse_source(input_source):
+    """
+    A camera index given as a digit string ("0") becomes an int; anything else is a file path or URL.
+    """
+    if isinstance(input_source, str) and input_source.strip().isdigit():
+        return int(input_source)
+    return input_source
+
+
+class VideoSource:
+    """
+    Reads frames from a camera, stream URL or video file for one stream's pipeline.
+    Frames are grabbed and only decoded when selected, so frames dropped by the frame skipper cost no decoding.
+    A live source (camera or URL) that fails to open or stops delivering frames is reopened with exponential
+    backoff, so a Wi-Fi hiccup on an ESP32-CAM pauses detection instead of ending it. A video file ends at
+    its last frame. Each frame is stamped with time.monotonic() right after it is grabbed.
+    """
+
+    def __init__(self, input_source, name='', stop_event=None, backend=CAPTURE_BACKEND,
+                 hw_acceleration=CAPTURE_HW_ACCELERATION, buffer_size=CAPTURE_BUFFER_SIZE,
+                 open_timeout=CAPTURE_OPEN_TIMEOUT, read_timeout=CAPTURE_READ_TIMEOUT,
+                 reconnect_min=CAPTURE_RECONNECT_MIN, reconnect_max=CAPTURE_RECONNECT_MAX,
+                 max_reconnects=CAPTURE_MAX_RECONNECTS):
+        """
+        :param name: Label for log messages and the capture / decode timings in /metrics, usually the stream ID
+        :param stop_event: Event that interrupts reads and reconnect delays when set
+        """
+        self.source = parse_source(input_source)
+        self.name = name
+        self.stop_event = stop_event or Event()
+        # Cameras, stream URLs and GStreamer pipelines are reconnected; anything else is a file that ends
+        self.live = isinstance(self.source, int) or '://' in self.source or ' ! ' in self.source
+        if backend not in _BACKENDS:
+            print(f"[{name}] Unknown CAPTURE_BACKEND '{backend}', using auto")
+            backend = 'auto'
+        self.backend = backend
+        self.hw_acceleration = hw_acceleration
+        self.buffer_size = buffer_size
+        self.open_timeout = open_timeout
+        self.read_timeout = read_timeout
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = max(reconnect_min, reconnect_max)
+        self.max_reconnects = max_reconnects
+
+        self.state = 'connecting'
+        self.last_error = None
+        self.connected_at = None
+        self.reconnects = 0
+        self.failed_attempts = 0
+        self.frames_grabbed = 0
+        self.frames_decoded = 0
+        self.frames_skipped = 0
+        self.last_frame_at = None
+        self.backend_name = None
+        self.hw_decoding = None
+        self._cap = None
+        self._lock = Lock()
+
+    def _params(self):
+        # Timeouts and hardware decoding are FFmpeg options; camera drivers (V4L2, DSHOW) and GStreamer
+        # pipelines can refuse to open when given them
+        if not isinstance(self.source, str) or ' ! ' in self.source or self.backend not in ('auto', 'ffmpeg'):
+            return []
+        params = []
+        for prop, value in (('CAP_PROP_OPEN_TIMEOUT_MSEC', self.open_timeout * 1000),
+                            ('CAP_PROP_READ_TIMEOUT_MSEC', self.read_timeout * 1000),
+                            ('CAP_PROP_HW_ACCELERATION', _HW_ACCELERATION.get(self.hw_acceleration))):
+            # Properties missing from older OpenCV builds are left to the backend's defaults
+            if hasattr(cv2, prop) and value is not None:
+                params += [getattr(cv2, prop), int(value)]
+        return params
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.source, _BACKENDS[self.backend], self._params())
+        if not cap.isOpened():
+            cap.release()
+            return None
+        # Only some backends honor a buffer size; the others keep their default
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size)
+        return cap
+
+    def _connect(self):
+        """
+        Open the source, retrying a live source with exponential backoff.
+        :return: True once connected, False if the source cannot be opened or stop was requested
+        """
+        while not self.stop_event.is_set():
+            cap = self._open()
+            if cap is not None:
+                with self._lock:
+                    self._cap = cap
+                    self.state = 'connected'
+                    self.connected_at = time.time()
+                    self.backend_name = cap.getBackendName()
+                    self.hw_decoding = (int(cap.get(cv2.CAP_PROP_HW_ACCELERATION))
+                                        if hasattr(cv2, 'CAP_PROP_HW_ACCELERATION') else None)
+                print(f"[{self.name}] Opened video source {self.source} ({self.backend_name})")
+                return True
+
+            if not self._backoff(f"Unable to open video source: {self.source}"):
+                return False
+        return False
+
+    def _backoff(self, error):
+        """
+        Count a failed attempt and wait before the next one; the count is only reset once a frame is decoded,
+        so a source that opens but never delivers frames still backs off and eventually fails.
+        :return: False if the source should not be retried
+        """
+        self.failed_attempts += 1
+        self.last_error = error
+        if not self.live or (self.max_reconnects and self.failed_attempts > self.max_reconnects):
+            self.state = 'failed'
+            print(f"[{self.name}] Error: {error}")
+            return False
+        delay = min(self.reconnect_max, self.reconnect_min * 2 ** (self.failed_attempts - 1))
+        self.state = 'reconnecting'
+        print(f"[{self.name}] {error}; retrying in {delay:.1f}s")
+        self.stop_event.wait(delay)
+        return True
+
+    def _lost(self, error):
+        with self._lock:
+            if self._cap is not None:
+                self._cap.release()
+                self._cap = None
+        if not self.live:
+            self.state = 'ended'
+            print(f"[{self.name}] End of video source {self.source}")
+            return
+        self.reconnects += 1
+        self._backoff(f"Lost video source {self.source} ({error})")
+
+    def read(self, select=None):
+        """
+        Return the next frame, reconnecting as needed.
+        :param select: Optional callable() run once per grabbed frame; frames it returns False for are not decoded
+        :return: Tuple of (frame, captured_at) with captured_at from time.monotonic(), or None once the source has
+                 ended, cannot be reopened, or stop was requested
+        """
+        while not self.stop_event.is_set():
+            if self._cap is None and (self.state in ('ended', 'failed') or not self._connect()):
+                return None
+            with metrics.timer(STAGE_SECONDS, stream=self.name, stage='capture'):
+                grabbed = self._cap.grab()
+            if not grabbed:
+                self._lost("no frame received")
+                continue
+            captured_at = time.monotonic()
+            self.frames_grabbed += 1
+            if select is not None and not select():
+                self.frames_skipped += 1
+                metrics.inc(CAPTURE_SKIPPED_FRAMES, stream=self.name)
+                continue
+            with metrics.timer(STAGE_SECONDS, stream=self.name, stage='decode'):
+                decoded, frame = self._cap.retrieve()
+            if not decoded or frame is None:
+                self._lost("frame could not be decoded")
+                continue
+            self.frames_decoded += 1
+            self.failed_attempts = 0
+            self.last_frame_at = captured_at
+            return frame, captured_at
+        return None
+
+    def release(self):
+        with self._lock:
+            if self._cap is not None:
+                self._cap.release()
+                self._cap = None
+        if self.state not in ('ended', 'failed'):
+            self.state = 'stopped'
+
+    @property
+    def connected(self):
+        return self.state == 'connected'
+
+    def stats(self):
+        return {
+            "source": str(self.source),
+            "live": self.live,
+            "state": self.state,
+            "backend": self.backend_name,
+            "hw_acceleration": self.hw_decoding,
+            "buffer_size": self.buffer_size,
+            "connected_at": self.connected_at,
+            "reconnects": self.reconnects,
+            "failed_attempts": self.failed_attempts,
+            "last_error": self.last_error,
+            "frames_grabbed": self.frames_grabbed,
+            "frames_decoded": self.frames_decoded,
+            "frames_skipped": self.frames_skipped,
+            "last_frame_age_seconds": time.monotonic() - self.last_frame_at if self.last_frame_at else None,
+        }